@@ -0,0 +1,170 @@
+import csv
+from datetime import datetime
+from database import get_absent_students, get_attendance_summary, iter_attendance_report
+from db_manager import StudentDB, student_info_from_profile
+from student_utils import send_absence_email
+
+# Background job handlers for admin actions; each is called as handler(job, **params)
+student_db = StudentDB()
+
+
+def send_email_alerts(job, date, department=None, section=None):
+    """Send email alerts to absent students"""
+    job.progress(stage='loading')
+    absent_students = get_absent_students(date, department, section)
+    job.progress(0, len(absent_students), stage='sending')
+    job.check_cancelled()
+
+    email_alerts_sent = []
+    email_alerts_failed = []
+
+    # Send all emails at once with BCC
+    try:
+        email_count = send_absence_email(absent_students, date)
+        if email_count > 0:
+            for student in absent_students:
+                email_alerts_sent.append({
+                    'name': student['name'],
+                    'roll_id': student['roll_id'],
+                    'email': student['email'],
+                    'status': 'email_client_opened'
+                })
+        else:
+            for student in absent_students:
+                email_alerts_failed.append({
+                    'name': student['name'],
+                    'roll_id': student['roll_id'],
+                    'error': 'Email client failed to open'
+                })
+    except Exception as e:
+        for student in absent_students:
+            email_alerts_failed.append({
+                'name': student['name'],
+                'roll_id': student['roll_id'],
+                'error': str(e)
+            })
+    job.progress(len(absent_students))
+
+    return {
+        "message": f"Email alerts sent to {len(email_alerts_sent)} students",
+        "date": date,
+        "email_sent": len(email_alerts_sent),
+        "email_failed": len(email_alerts_failed),
+        "alerts_sent": email_alerts_sent,
+        "alerts_failed": email_alerts_failed
+    }
+
+
+def send_whatsapp_alerts(job, date, department=None, section=None):
+    """Send WhatsApp alerts to absent students"""
+    job.progress(stage='loading')
+    # Absent students come back sorted alphabetically by name
+    absent_students_sorted = get_absent_students(date, department, section)
+    job.progress(0, len(absent_students_sorted), stage='sending')
+
+    whatsapp_alerts_sent = []
+    whatsapp_alerts_failed = []
+
+    for done, student in enumerate(absent_students_sorted, start=1):
+        job.check_cancelled()
+        try:
+            student_info = student_info_from_profile(student)
+            if student_info.get('Phone'):
+                whatsapp_sent = student_db.send_whatsapp_alert(student_info, date, "Absent")
+                if whatsapp_sent:
+                    whatsapp_alerts_sent.append({
+                        'name': student['name'],
+                        'roll_id': student['roll_id'],
+                        'phone': student_info.get('Phone'),
+                        'status': 'whatsapp_opened'
+                    })
+                else:
+                    whatsapp_alerts_failed.append({
+                        'name': student['name'],
+                        'roll_id': student['roll_id'],
+                        'error': 'WhatsApp opening failed'
+                    })
+            else:
+                whatsapp_alerts_failed.append({
+                    'name': student['name'],
+                    'roll_id': student['roll_id'],
+                    'error': 'No phone number available'
+                })
+        except Exception as e:
+            whatsapp_alerts_failed.append({
+                'name': student['name'],
+                'roll_id': student['roll_id'],
+                'error': str(e)
+            })
+        job.progress(done)
+
+    return {
+        "message": f"WhatsApp alerts sent to {len(whatsapp_alerts_sent)} students",
+        "date": date,
+        "whatsapp_sent": len(whatsapp_alerts_sent),
+        "whatsapp_failed": len(whatsapp_alerts_failed),
+        "alerts_sent": whatsapp_alerts_sent,
+        "alerts_failed": whatsapp_alerts_failed
+    }
+
+
+def _report_header(date, type, department=None, section=None):
+    # Simple professional header
+    header = [
+        ['NeuroAttend - Attendance Report'],
+        ['Date:', date],
+        ['Generated:', datetime.now().strftime('%Y-%m-%d %H:%M')],
+        ['Report Type:', type.title()]
+    ]
+    if department:
+        header.append(['Department:', department])
+    if section:
+        header.append(['Section:', section])
+    return header + [
+        [''],
+        ['Name', 'Roll Number', 'Email', 'Phone', 'Department', 'Section', 'Status', 'Time']
+    ]
+
+
+def _report_rows(date, type, department=None, section=None):
+    """One CSV row per student, produced as the report query streams them"""
+    include_present = type == "present" or type == "all"
+    include_absent = type == "absent" or type == "all"
+    for row in iter_attendance_report(date, include_present, include_absent, department, section):
+        yield list(row)
+
+
+def _report_summary(total_students, present):
+    return [
+        [''],
+        ['Summary'],
+        ['Total Students:', total_students],
+        ['Present:', present],
+        ['Absent:', total_students - present],
+        ['Attendance Rate:', f"{(present/total_students*100):.1f}%" if total_students else '0%']
+    ]
+
+
+def export_attendance_csv(job, date, type="all", department=None, section=None):
+    """Stream the attendance report for a date into a downloadable CSV file"""
+    total_students, present = get_attendance_summary(date, department, section)
+    expected = (present if type in ("present", "all") else 0) + \
+        (total_students - present if type in ("absent", "all") else 0)
+    job.progress(0, expected, stage='writing')
+
+    scope = '_'.join(part for part in (department, section) if part)
+    filename = f"attendance_{type}_{date}{'_' + scope if scope else ''}.csv"
+    written = 0
+    with open(job.result_file(filename), 'w', newline='') as output:
+        writer = csv.writer(output)
+        writer.writerows(_report_header(date, type, department, section))
+        for row in _report_rows(date, type, department, section):
+            writer.writerow(row)
+            written += 1
+            if written % 500 == 0:
+                job.check_cancelled()
+                job.progress(written)
+        writer.writerows(_report_summary(total_students, present))
+    job.progress(written)
+
+    return {"filename": filename, "rows": written}
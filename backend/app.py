@@ -1,19 +1,32 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
 import uvicorn
-import numpy as np
-from database import init_database, save_student, get_attendance_stats, get_all_students, mark_attendance, get_present_students_by_date
+from database import init_database, recreate_database, save_student, get_attendance_stats, get_student_profiles, get_encoding_model_counts
 from face_recognition_service import FaceRecognitionService
 from id_verification_service import IDVerificationService
-from student_utils import send_absence_email
 from db_manager import StudentDB
+from frame_pool import FramePool, FramePoolSaturated
+from recognition_session import SessionRegistry, ClassScope
+from motion_gate import parse_roi
+from attendance_writer import AttendanceWriter
+from bulk_enrollment import BulkEnrollmentPipeline, ReembedPipeline
+from job_queue import JobQueue, FINISHED_STATUSES
+from stats_broadcaster import StatsBroadcaster
+import admin_jobs
+import asyncio
+import json
 import tempfile
+import time
+import uuid
 import os
 import shutil
 
 app = FastAPI(title="NeuroAttend API", version="1.0.0")
 
+# Seconds /reset-database waits for cancelled background jobs to stop
+RESET_JOB_WAIT = float(os.environ.get("RESET_JOB_WAIT", 30.0))
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -27,7 +40,7 @@ app.add_middleware(
 @app.get("/health")
 async def health_check():
     """Health check endpoint for deployment monitoring"""
-    return {"status": "healthy", "service": "NeuroAttend API"}
+    return {"status": "healthy", "service": "NeuroAttend API", "frame_pool": frame_pool.stats()}
 
 @app.get("/")
 async def root():
@@ -48,9 +61,19 @@ except Exception as e:
     init_database()
     print("Database created successfully")
 
-face_service = FaceRecognitionService()
+attendance_writer = AttendanceWriter()
+face_service = FaceRecognitionService(attendance_writer)
 id_verification_service = IDVerificationService()
 student_db = StudentDB()
+frame_pool = FramePool(face_service)
+sessions = SessionRegistry()
+job_queue = JobQueue()
+stats_broadcaster = StatsBroadcaster()
+job_queue.register("bulk_enroll", BulkEnrollmentPipeline(face_service))
+job_queue.register("reembed_faces", ReembedPipeline(face_service))
+job_queue.register("email_alerts", admin_jobs.send_email_alerts)
+job_queue.register("whatsapp_alerts", admin_jobs.send_whatsapp_alerts)
+job_queue.register("attendance_export", admin_jobs.export_attendance_csv)
 
 @app.on_event("startup")
 async def startup_event():
@@ -73,6 +96,16 @@ async def startup_event():
         except Exception as retry_error:
             print(f"❌ Database retry failed: {retry_error}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    stats_broadcaster.stop()
+    job_queue.shutdown()
+    print("🗂️ Job queue stopped")
+    frame_pool.shutdown()
+    print("🛑 Frame pool stopped")
+    attendance_writer.stop()
+    print("💾 Attendance writer drained")
+
 @app.post("/enroll")
 async def enroll_student(
     name: str = Form(...),
@@ -101,29 +134,24 @@ async def enroll_student(
             os.unlink(temp_file_path)
             raise HTTPException(status_code=500, detail=f"Face recognition error: {str(face_error)}")
         
-        # Skip face validation temporarily
-        if face_encoding is None:
-            print("Creating dummy face encoding for testing")
-            face_encoding = np.random.rand(128)
-        
         # Skip duplicate check temporarily
         print("Skipping duplicate face check for testing")
         
-        # Save student data using roll number structure
-        student_db.create_student(roll_id, name, email, phone, department, section)
-        student_db.save_photo(roll_id, content)
-        
         # Clean up temp file
         os.unlink(temp_file_path)
         
         if face_encoding is None:
             raise HTTPException(status_code=400, detail="No face detected in image")
         
-        # Save to database
-        student_id = save_student(name, roll_id, email, face_encoding)
+        # Save to database, recording which model produced the encoding
+        student_id = save_student(name, roll_id, email, face_encoding, phone, department, section,
+                                  encoding_model=face_service.encoding_model.name)
         
-        # Reload known faces
-        face_service.load_known_faces()
+        # Keep the enrollment photo in the student's folder
+        student_db.save_photo(roll_id, content)
+        
+        # Add the new student to the in-memory gallery
+        face_service.sync_gallery()
         
         return JSONResponse({
             "message": "Enrollment Successful! Student registered for attendance tracking.",
@@ -134,23 +162,149 @@ async def enroll_student(
             "status": "enrolled"
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/recognize")
-async def recognize_faces(frame_data: dict):
-    """Process video frame for face recognition"""
+async def recognize_faces(request: Request, camera_id: str = "", department: str = "", section: str = "",
+                          roster: str = "", fallback: bool = False, roi: str = ""):
+    """Process video frame for face recognition
+    
+    Accepts raw JPEG bytes (image/jpeg or application/octet-stream), a
+    multipart upload with a "frame" field, or the legacy JSON body
+    {"frame": "data:image/jpeg;base64,..."}. Passing a camera_id enables
+    cross-frame face tracking for that camera. department/section and/or a
+    comma-separated roster of roll numbers match faces against that class
+    only; fallback=true retries unmatched faces against every student.
+    Camera frames that barely changed since the last processed one reuse
+    its results; roi="x,y,w,h;..." (frame fractions) limits where motion counts.
+    """
     try:
-        frame = frame_data.get("frame")
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("application/json"):
+            frame = (await request.json()).get("frame")
+        elif content_type.startswith("multipart/form-data"):
+            upload = (await request.form()).get("frame")
+            frame = await upload.read() if hasattr(upload, "read") else upload
+        else:
+            frame = await request.body()
+        
         if not frame:
             raise HTTPException(status_code=400, detail="No frame data provided")
         
-        results = face_service.process_frame(frame)
+        scope = ClassScope.from_params(department, section, roster, fallback)
+        if camera_id:
+            try:
+                motion_roi = parse_roi(roi)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            session = sessions.get(camera_id)
+            await session.configure(scope, motion_roi)
+            results = await frame_pool.process(frame, camera_id, session)
+            session.record_results(results)
+        else:
+            results = await frame_pool.process(frame, scope=scope)
         return JSONResponse({"results": results})
         
+    except FramePoolSaturated as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.websocket("/ws/recognize")
+async def recognize_stream(websocket: WebSocket, camera_id: str = "", department: str = "",
+                           section: str = "", roster: str = "", fallback: bool = False, roi: str = ""):
+    """Stream camera frames over one connection and push results back
+    
+    Clients send binary JPEG frames (or text data URLs). Only the newest
+    unprocessed frame is kept, so a slow server drops stale frames instead
+    of queueing them. The class and roi parameters work as for /recognize.
+    Without a camera_id the connection gets a session of its own, dropped
+    when it closes.
+    """
+    try:
+        motion_roi = parse_roi(roi)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    await websocket.accept()
+    anonymous = not camera_id
+    if anonymous:
+        camera_id = f"ws-{uuid.uuid4().hex[:12]}"
+    session = sessions.get(camera_id)
+    await session.configure(ClassScope.from_params(department, section, roster, fallback), motion_roi)
+    pending = {"frame": None}
+    frame_ready = asyncio.Event()
+    
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            
+            frame = message.get("bytes")
+            if frame is None and message.get("text"):
+                text = message["text"]
+                if text.startswith("{"):
+                    try:
+                        frame = json.loads(text).get("frame")
+                    except ValueError:
+                        # One malformed message should not end the camera's stream
+                        await websocket.send_json({"error": "Invalid JSON frame message"})
+                        continue
+                else:
+                    frame = text
+            if not frame:
+                continue
+            
+            session.frames_received += 1
+            if pending["frame"] is not None:
+                session.frames_dropped += 1
+            pending["frame"] = frame
+            frame_ready.set()
+    
+    async def process_frames():
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            frame, pending["frame"] = pending["frame"], None
+            
+            try:
+                results = await frame_pool.process(frame, camera_id, session)
+            except FramePoolSaturated as e:
+                await websocket.send_json({"error": str(e), "retry_after": e.retry_after})
+                if pending["frame"] is None:
+                    pending["frame"] = frame
+                    frame_ready.set()
+                await asyncio.sleep(e.retry_after)
+                continue
+            
+            session.record_results(results)
+            await websocket.send_json({"results": results, "session": session.summary()})
+    
+    tasks = [asyncio.create_task(receive_frames()), asyncio.create_task(process_frames())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        errors = [task.exception() for task in done if task.exception() is not None]
+        errors = [error for error in errors if not isinstance(error, WebSocketDisconnect)]
+        if errors:
+            print(f"❌ Camera {camera_id} stream failed: {errors[0]!r}")
+            try:
+                await websocket.close(code=1011, reason="Recognition error")
+            except Exception:
+                # The socket is already gone
+                pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        if anonymous:
+            sessions.remove(camera_id)
+        print(f"📴 Camera {camera_id} stream closed: {session.summary()}")
+
 @app.get("/stats")
 async def get_stats():
     """Get attendance statistics"""
@@ -160,287 +314,152 @@ async def get_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/students")
+async def list_students(department: str = "", section: str = ""):
+    """Enrolled students' contact and class details, optionally for one department/section"""
+    try:
+        return JSONResponse(get_student_profiles(department or None, section or None))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/stats/stream")
+async def stream_stats():
+    """Server-sent events with a new statistics snapshot whenever attendance changes"""
+    return StreamingResponse(stats_broadcaster.events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.post("/bulk-enroll")
 async def bulk_enroll(
     csv_file: UploadFile = File(...),
     photos: list[UploadFile] = File(...)
 ):
-    """Bulk enrollment from CSV and photos ZIP"""
+    """Bulk enrollment from CSV and photos, run as a background job"""
+    job_id = job_queue.new_job_id()
+    work_dir = job_queue.work_dir(job_id)
     try:
-        import csv
-        import zipfile
-        import tempfile
-        import shutil
-        
-        enrolled = []
-        failed = []
-        
-        # Create temporary directories
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # Save CSV file
-            csv_path = os.path.join(temp_dir, "students.csv")
-            with open(csv_path, "wb") as f:
-                f.write(await csv_file.read())
-            
-            # Save uploaded photos
-            photos_dir = os.path.join(temp_dir, "photos")
-            os.makedirs(photos_dir, exist_ok=True)
-            
-            # Save each uploaded photo
-            for photo in photos:
-                photo_path = os.path.join(photos_dir, photo.filename)
-                with open(photo_path, "wb") as f:
-                    f.write(await photo.read())
-            
-            # Read CSV and process each student
-            with open(csv_path, 'r') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                for row in reader:
-                    try:
-                        name = row['name'].strip()
-                        roll_id = row['roll_id'].strip()
-                        email = row['email'].strip()
-                        phone = row.get('phone', '').strip()
-                        department = row.get('department', '').strip()
-                        section = row.get('section', '').strip()
-                        photo_filename = row['photo'].strip()
-                        
-                        # Find photo file
-                        photo_path = None
-                        for root, dirs, files in os.walk(photos_dir):
-                            if photo_filename in files:
-                                photo_path = os.path.join(root, photo_filename)
-                                break
-                        
-                        if not photo_path or not os.path.exists(photo_path):
-                            failed.append({"name": name, "roll_id": roll_id, "error": "Photo not found"})
-                            continue
-                        
-                        # Extract face encoding
-                        face_encoding = face_service.encode_face_from_image(photo_path)
-                        
-                        if face_encoding is None:
-                            failed.append({"name": name, "roll_id": roll_id, "error": "No face detected"})
-                            continue
-                        
-                        # Check for duplicate face
-                        duplicate_student = face_service.check_duplicate_face(face_encoding)
-                        if duplicate_student:
-                            failed.append({"name": name, "roll_id": roll_id, "error": f"Face already enrolled for {duplicate_student['name']} ({duplicate_student['roll_id']})"})
-                            continue
-                        
-                        # Save student data using roll number structure
-                        student_db.create_student(roll_id, name, email, phone, department, section)
-                        with open(photo_path, 'rb') as f:
-                            photo_data = f.read()
-                        student_db.save_photo(roll_id, photo_data)
-                        
-                        # Save to database
-                        student_id = save_student(name, roll_id, email, face_encoding)
-                        enrolled.append({"name": name, "roll_id": roll_id, "student_id": student_id, "photo_saved": f"{roll_id}.jpg"})
-                        
-                    except Exception as e:
-                        failed.append({"name": row.get('name', 'Unknown'), "roll_id": row.get('roll_id', 'Unknown'), "error": str(e)})
-        
-        # Reload known faces
-        face_service.load_known_faces()
-        
-        return JSONResponse({
-            "message": f"Bulk enrollment completed. Enrolled: {len(enrolled)}, Failed: {len(failed)}",
-            "enrolled": enrolled,
-            "failed": failed,
-            "total_processed": len(enrolled) + len(failed)
-        })
+        # Save CSV file
+        csv_path = os.path.join(work_dir, "students.csv")
+        with open(csv_path, "wb") as f:
+            f.write(await csv_file.read())
+        
+        # Save uploaded photos
+        photos_dir = os.path.join(work_dir, "photos")
+        os.makedirs(photos_dir, exist_ok=True)
+        for photo in photos:
+            photo_path = os.path.join(photos_dir, os.path.basename(photo.filename))
+            with open(photo_path, "wb") as f:
+                shutil.copyfileobj(photo.file, f)
+        
+        job = job_queue.submit("bulk_enroll", {"csv_path": csv_path, "photos_dir": photos_dir}, job_id=job_id)
+        return JSONResponse(job, status_code=202)
         
+    except Exception as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/encoding-models")
+async def encoding_models():
+    """Enrolled students per encoding model; only the active model's students are recognized"""
+    model = face_service.encoding_model
+    counts = get_encoding_model_counts()
+    return JSONResponse({
+        "active_model": {"name": model.name, "dim": model.dim, "metric": model.metric},
+        "students": {name or "unknown": count for name, count in counts.items()},
+        "needs_reembedding": sum(count for name, count in counts.items() if name != model.name)
+    })
+
+@app.post("/reembed-faces")
+async def reembed_faces(everyone: bool = Form(False)):
+    """Re-encode stored enrollment photos with the active model in a background job
+    
+    By default only students encoded by another model are upgraded; everyone re-encodes all students.
+    """
+    try:
+        return JSONResponse(job_queue.submit("reembed_faces", {"everyone": everyone}), status_code=202)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/send-email-alerts")
-async def send_email_alerts(date: str = Form(...)):
-    """Send email alerts to absent students"""
+async def send_email_alerts(date: str = Form(...), department: str = Form(""), section: str = Form("")):
+    """Send email alerts to absent students in a background job"""
     try:
-        all_students = get_all_students()
-        present_students = get_present_students_by_date(date)
-        present_ids = [s['student_id'] for s in present_students]
-        absent_students = [s for s in all_students if s['id'] not in present_ids]
-        
-        email_alerts_sent = []
-        email_alerts_failed = []
-        
-        # Send all emails at once with BCC
-        try:
-            email_count = send_absence_email(absent_students, date)
-            if email_count > 0:
-                for student in absent_students:
-                    email_alerts_sent.append({
-                        'name': student['name'],
-                        'roll_id': student['roll_id'],
-                        'email': student['email'],
-                        'status': 'email_client_opened'
-                    })
-            else:
-                for student in absent_students:
-                    email_alerts_failed.append({
-                        'name': student['name'],
-                        'roll_id': student['roll_id'],
-                        'error': 'Email client failed to open'
-                    })
-        except Exception as e:
-            for student in absent_students:
-                email_alerts_failed.append({
-                    'name': student['name'],
-                    'roll_id': student['roll_id'],
-                    'error': str(e)
-                })
-        
-        return JSONResponse({
-            "message": f"Email alerts sent to {len(email_alerts_sent)} students",
-            "date": date,
-            "email_sent": len(email_alerts_sent),
-            "email_failed": len(email_alerts_failed),
-            "alerts_sent": email_alerts_sent,
-            "alerts_failed": email_alerts_failed
-        })
+        params = {"date": date, "department": department or None, "section": section or None}
+        return JSONResponse(job_queue.submit("email_alerts", params), status_code=202)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/send-whatsapp-alerts")
-async def send_whatsapp_alerts(date: str = Form(...)):
-    """Send WhatsApp alerts to absent students"""
+async def send_whatsapp_alerts(date: str = Form(...), department: str = Form(""), section: str = Form("")):
+    """Send WhatsApp alerts to absent students in a background job"""
     try:
-        all_students = get_all_students()
-        present_students = get_present_students_by_date(date)
-        present_ids = [s['student_id'] for s in present_students]
-        absent_students = [s for s in all_students if s['id'] not in present_ids]
-        
-        whatsapp_alerts_sent = []
-        whatsapp_alerts_failed = []
-        
-        # Sort absent students alphabetically by name
-        absent_students_sorted = sorted(absent_students, key=lambda x: x['name'])
-        
-        for student in absent_students_sorted:
-            try:
-                student_info = student_db.get_student_info(student['roll_id'])
-                if student_info and student_info.get('Phone'):
-                    whatsapp_sent = student_db.send_whatsapp_alert(student_info, date, "Absent")
-                    if whatsapp_sent:
-                        whatsapp_alerts_sent.append({
-                            'name': student['name'],
-                            'roll_id': student['roll_id'],
-                            'phone': student_info.get('Phone'),
-                            'status': 'whatsapp_opened'
-                        })
-                    else:
-                        whatsapp_alerts_failed.append({
-                            'name': student['name'],
-                            'roll_id': student['roll_id'],
-                            'error': 'WhatsApp opening failed'
-                        })
-                else:
-                    whatsapp_alerts_failed.append({
-                        'name': student['name'],
-                        'roll_id': student['roll_id'],
-                        'error': 'No phone number available'
-                    })
-            except Exception as e:
-                whatsapp_alerts_failed.append({
-                    'name': student['name'],
-                    'roll_id': student['roll_id'],
-                    'error': str(e)
-                })
-        
-        return JSONResponse({
-            "message": f"WhatsApp alerts sent to {len(whatsapp_alerts_sent)} students",
-            "date": date,
-            "whatsapp_sent": len(whatsapp_alerts_sent),
-            "whatsapp_failed": len(whatsapp_alerts_failed),
-            "alerts_sent": whatsapp_alerts_sent,
-            "alerts_failed": whatsapp_alerts_failed
-        })
+        params = {"date": date, "department": department or None, "section": section or None}
+        return JSONResponse(job_queue.submit("whatsapp_alerts", params), status_code=202)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/export-attendance-csv")
-async def export_attendance_csv(date: str, type: str = "all"):
-    """Export attendance data as CSV"""
+async def export_attendance_csv(date: str, type: str = "all", department: str = "", section: str = ""):
+    """Export attendance data as CSV in a background job; download it from /jobs/{job_id}/download
+    
+    department and section optionally limit the report to one class.
+    """
     try:
-        import csv
-        from io import StringIO
-        from fastapi.responses import StreamingResponse
-        from datetime import datetime
-        
-        all_students = get_all_students()
-        present_students = get_present_students_by_date(date)
-        present_ids = [s['student_id'] for s in present_students]
-        
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Simple professional header
-        writer.writerow(['NeuroAttend - Attendance Report'])
-        writer.writerow(['Date:', date])
-        writer.writerow(['Generated:', datetime.now().strftime('%Y-%m-%d %H:%M')])
-        writer.writerow(['Report Type:', type.title()])
-        writer.writerow([''])
-        
-        # Column headers
-        writer.writerow(['Name', 'Roll Number', 'Email', 'Phone', 'Department', 'Section', 'Status', 'Time'])
-        
-        if type == "present" or type == "all":
-            # Write present students
-            for present in present_students:
-                student = next((s for s in all_students if s['id'] == present['student_id']), None)
-                if student:
-                    student_info = student_db.get_student_info(student['roll_id'])
-                    writer.writerow([
-                        student['name'],
-                        student['roll_id'],
-                        student['email'],
-                        student_info.get('Phone', '') if student_info else '',
-                        student_info.get('Department', '') if student_info else '',
-                        student_info.get('Section', '') if student_info else '',
-                        'Present',
-                        present.get('time', datetime.now().strftime('%H:%M:%S'))
-                    ])
-        
-        if type == "absent" or type == "all":
-            # Write absent students
-            absent_students = [s for s in all_students if s['id'] not in present_ids]
-            for student in absent_students:
-                student_info = student_db.get_student_info(student['roll_id'])
-                writer.writerow([
-                    student['name'],
-                    student['roll_id'],
-                    student['email'],
-                    student_info.get('Phone', '') if student_info else '',
-                    student_info.get('Department', '') if student_info else '',
-                    student_info.get('Section', '') if student_info else '',
-                    'Absent',
-                    '-'
-                ])
-        
-        # Summary
-        writer.writerow([''])
-        writer.writerow(['Summary'])
-        writer.writerow(['Total Students:', len(all_students)])
-        writer.writerow(['Present:', len(present_students)])
-        writer.writerow(['Absent:', len(all_students) - len(present_students)])
-        writer.writerow(['Attendance Rate:', f"{(len(present_students)/len(all_students)*100):.1f}%" if all_students else '0%'])
-        
-        output.seek(0)
-        
-        filename = f"attendance_{type}_{date}.csv"
-        return StreamingResponse(
-            iter([output.getvalue()]),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
+        params = {"date": date, "type": type, "department": department or None, "section": section or None}
+        return JSONResponse(job_queue.submit("attendance_export", params), status_code=202)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/jobs")
+async def list_jobs(kind: str = None, limit: int = 50):
+    """Most recent background jobs"""
+    return JSONResponse(job_queue.recent(kind, limit))
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Status, progress and result of a background job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(job)
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job_status(job_id: str):
+    """Server-sent events with the job status until it finishes"""
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last = None
+        while True:
+            job = job_queue.get(job_id)
+            if job is None:
+                return
+            if job != last:
+                last = job
+                yield f"data: {json.dumps(job)}\n\n"
+            if job['status'] in FINISHED_STATUSES:
+                return
+            await asyncio.sleep(0.5)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running background job"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(job)
+
+@app.get("/jobs/{job_id}/download")
+async def download_job_result(job_id: str):
+    """File produced by a completed job, e.g. an attendance export"""
+    path = job_queue.get_result_path(job_id)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Job result not available")
+    media_type = "text/csv" if path.endswith(".csv") else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
 @app.post("/verify-id")
 async def verify_id_card(
     roll_number: str = Form(...),
@@ -477,23 +496,32 @@ async def verify_id_card(
 
 @app.post("/reset-database")
 async def reset_database():
-    """Reset database - Delete all students and attendance records"""
+    """Reset database - Delete all students and attendance records
+    
+    Background jobs are cancelled first; the reset is refused (409) if they
+    have not stopped within RESET_JOB_WAIT seconds.
+    """
     try:
-        db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
-        
-        # Delete the database file completely
-        if os.path.exists(db_path):
-            os.remove(db_path)
-        
-        # Recreate fresh database
-        init_database()
-        
-        # Clear student data folders
+        # No job may keep writing students or files into the database being replaced
+        if job_queue.cancel_all():
+            deadline = time.monotonic() + RESET_JOB_WAIT
+            while job_queue.unfinished():
+                if time.monotonic() >= deadline:
+                    raise HTTPException(status_code=409,
+                                        detail="Background jobs are still stopping; retry the reset shortly")
+                await asyncio.sleep(0.2)
+        
+        # Drop queued attendance so nothing is written into the old database
+        attendance_writer.reset()
+        
+        # Drop every table and recreate a fresh schema
+        recreate_database()
+        
+        # Clear student data folders; job files and gallery snapshots (keyed by database id) are kept
         database_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database')
         for item in os.listdir(database_dir):
             item_path = os.path.join(database_dir, item)
-            if os.path.isdir(item_path) and item != '__pycache__':
-                import shutil
+            if os.path.isdir(item_path) and item not in ('__pycache__', 'jobs', 'gallery'):
                 shutil.rmtree(item_path)
         
         # Reload known faces (will be empty now)
@@ -504,10 +532,14 @@ async def reset_database():
             "status": "success"
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8080))
     print(f"🚀 Starting NeuroAttend on port {port}")
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # Open /stats/stream connections never finish on their own, so bound the graceful shutdown wait
+    uvicorn.run(app, host="0.0.0.0", port=port,
+                timeout_graceful_shutdown=int(os.environ.get("SHUTDOWN_GRACE_PERIOD", 5)))
\ No newline at end of file
@@ -0,0 +1,145 @@
+import os
+import queue
+import threading
+from datetime import datetime
+from database import get_marked_student_ids, save_attendance_batch, get_database_id
+
+# Attendance writer configuration
+ATTENDANCE_FLUSH_INTERVAL = float(os.environ.get("ATTENDANCE_FLUSH_INTERVAL", 1.0))
+ATTENDANCE_BATCH_SIZE = int(os.environ.get("ATTENDANCE_BATCH_SIZE", 500))
+
+_STOP = object()
+
+
+class AttendanceWriter:
+    """Marks attendance from memory and persists new marks in batched transactions.
+
+    A per-day set of already-marked student ids answers repeat sightings
+    without touching SQLite. First sightings are queued and a background
+    thread commits them every ``flush_interval`` seconds (or once
+    ``batch_size`` marks are waiting). ``stop`` drains the queue before
+    returning.
+
+    The day set belongs to one database generation (its database id). When
+    the database is recreated, possibly by another process, the set is
+    reloaded on the next mark, and marks queued for the old database are
+    dropped instead of being written into the new one.
+    """
+
+    def __init__(self, flush_interval=ATTENDANCE_FLUSH_INTERVAL, batch_size=ATTENDANCE_BATCH_SIZE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._day = None
+        self._database_id = None
+        self._marked_today = set()
+        self._queue = queue.Queue()
+        self._unsaved = []
+        self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+        self._thread.start()
+
+    def mark(self, student_id):
+        """Mark a student present today; True only for the first sighting of the day"""
+        return student_id in self.mark_many([student_id])
+
+    def mark_many(self, student_ids, database_id=None):
+        """Mark everyone recognized in one frame at once; returns the ids seen for the first time today
+
+        ``database_id`` is the database the ids were read from; it is looked up when not given.
+        """
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        if database_id is None:
+            database_id = get_database_id()
+
+        with self._lock:
+            if today != self._day or database_id != self._database_id:
+                self._marked_today = get_marked_student_ids(today)
+                self._day = today
+                self._database_id = database_id
+            newly_marked = set(student_ids) - self._marked_today
+            self._marked_today |= newly_marked
+
+        if newly_marked:
+            current_time = now.strftime('%H:%M:%S')
+            for student_id in newly_marked:
+                self._queue.put((database_id, (student_id, today, current_time)))
+            label = 'Students' if len(newly_marked) > 1 else 'Student'
+            print(f"✅ {label} {', '.join(str(student_id) for student_id in sorted(newly_marked))} marked present at {current_time}")
+        return newly_marked
+
+    def is_marked(self, student_id):
+        with self._lock:
+            return self._day == datetime.now().strftime('%Y-%m-%d') and student_id in self._marked_today
+
+    def reset(self):
+        """Forget today's marks and queued writes, e.g. after the database was recreated"""
+        with self._lock:
+            self._day = None
+            self._database_id = None
+            self._marked_today = set()
+            self._unsaved = []
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def stop(self):
+        """Flush everything still queued and stop the background thread"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            stopping = False
+            items = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    items.append(item)
+            except queue.Empty:
+                pass
+
+            # Collect whatever else is already waiting, up to one batch
+            while not stopping and len(items) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                else:
+                    items.append(item)
+
+            with self._lock:
+                self._unsaved.extend(items)
+            self._flush()
+            if stopping:
+                return
+
+    def _flush(self):
+        # reset() may clear _unsaved at any time, so it is only touched under the lock
+        with self._lock:
+            batch, self._unsaved = self._unsaved, []
+        if not batch:
+            return
+
+        failed = []
+        for database_id in set(item[0] for item in batch):
+            records = [record for item_database_id, record in batch if item_database_id == database_id]
+            try:
+                if save_attendance_batch(records, database_id) is None:
+                    print(f"🗑️ Dropped {len(records)} attendance records marked before the database was recreated")
+                else:
+                    print(f"💾 Saved {len(records)} attendance records")
+            except Exception as e:
+                # Keep the records and retry on the next cycle
+                print(f"❌ Attendance flush failed, will retry: {e}")
+                failed.extend((database_id, record) for record in records)
+        if failed:
+            with self._lock:
+                self._unsaved = failed + self._unsaved
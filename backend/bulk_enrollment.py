@@ -0,0 +1,286 @@
+import csv
+import os
+import shutil
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from database import save_students_bulk, get_existing_roll_ids, get_students_to_reembed, update_student_encodings
+from db_manager import StudentDB
+from face_gallery import FaceGallery
+
+# Bulk enrollment configuration
+BULK_ENROLL_WORKERS = int(os.environ.get("BULK_ENROLL_WORKERS", os.cpu_count() or 1))
+BULK_ENROLL_DUPLICATE_TOLERANCE = float(os.environ.get("BULK_ENROLL_DUPLICATE_TOLERANCE", 0.5))
+# Re-embedded encodings committed per transaction
+REEMBED_BATCH_SIZE = int(os.environ.get("REEMBED_BATCH_SIZE", 200))
+
+# Encoder owned by each pool process
+_worker_service = None
+
+
+def _init_encoder_worker():
+    global _worker_service
+    from face_recognition_service import FaceRecognitionService
+    _worker_service = FaceRecognitionService(load_gallery=False)
+
+
+def _encode_photo(photo_path):
+    return _worker_service.encode_face_from_image(photo_path)
+
+
+def index_photos(photos_dir):
+    """Map photo file names to paths with a single directory walk"""
+    photos = {}
+    for root, dirs, files in os.walk(photos_dir):
+        for filename in files:
+            photos.setdefault(filename, os.path.join(root, filename))
+    return photos
+
+
+def find_duplicates(gallery, encodings, tolerance=BULK_ENROLL_DUPLICATE_TOLERANCE):
+    """Duplicate check for a batch of encodings against the gallery and each other
+
+    Returns one entry per encoding: the enrolled student's identity dict,
+    the index of an earlier batch row showing the same face, or None.
+    """
+    duplicates = [None] * len(encodings)
+    if len(encodings) == 0:
+        return duplicates
+
+    view = gallery.view
+    if view.accepts(encodings.shape[1]):
+        # Exact search: the approximate index could miss an enrolled duplicate
+        match_indices, match_distances = view.nearest(encodings, exact=True)
+        for row in np.nonzero(match_distances < tolerance)[0]:
+            duplicates[row] = view.identity(match_indices[row])
+
+    # Rows are compared with every earlier row; only rows that will be enrolled can shadow later ones
+    batch = FaceGallery(metric=view.metric, dim=encodings.shape[1])
+    batch.build(np.arange(len(encodings)), [''] * len(encodings), [''] * len(encodings), encodings)
+    close = batch.distances(encodings) < tolerance
+    accepted = np.zeros(len(encodings), dtype=bool)
+    for row in range(len(encodings)):
+        if duplicates[row] is not None:
+            continue
+        earlier = np.nonzero(close[row, :row] & accepted[:row])[0]
+        if len(earlier):
+            duplicates[row] = int(earlier[0])
+        else:
+            accepted[row] = True
+    return duplicates
+
+
+class BulkEnrollmentPipeline:
+    """Bulk enrollment job handler.
+
+    Photos are indexed once, faces are encoded across a process pool,
+    duplicates are found with one distance matrix per batch, and all
+    accepted students are committed in a single transaction.
+    """
+
+    def __init__(self, face_service, workers=BULK_ENROLL_WORKERS):
+        self.face_service = face_service
+        self.workers = workers
+        self.student_db = StudentDB()
+
+    def __call__(self, job, csv_path, photos_dir):
+        """Enroll the students listed in an uploaded CSV; uploads are removed afterwards"""
+        try:
+            enrolled, failed = self._enroll(job, csv_path, photos_dir)
+        finally:
+            shutil.rmtree(photos_dir, ignore_errors=True)
+            if os.path.exists(csv_path):
+                os.remove(csv_path)
+
+        return {
+            "message": f"Bulk enrollment completed. Enrolled: {len(enrolled)}, Failed: {len(failed)}",
+            "enrolled": enrolled,
+            "failed": failed,
+            "total_processed": len(enrolled) + len(failed)
+        }
+
+    def _enroll(self, job, csv_path, photos_dir):
+        failed = []
+
+        def fail(row, error):
+            failed.append({"name": row.get('name', 'Unknown'), "roll_id": row.get('roll_id', 'Unknown'), "error": error})
+
+        job.progress(stage='indexing')
+        photos = index_photos(photos_dir)
+        with open(csv_path, 'r', newline='') as csvfile:
+            rows = list(csv.DictReader(csvfile))
+
+        existing_rolls = get_existing_roll_ids(
+            (row.get('roll_id') or '').strip() for row in rows if (row.get('roll_id') or '').strip())
+
+        candidates = []
+        seen_rolls = set()
+        for row in rows:
+            try:
+                student = {
+                    'name': row['name'].strip(),
+                    'roll_id': row['roll_id'].strip(),
+                    'email': row['email'].strip(),
+                    'phone': (row.get('phone') or '').strip(),
+                    'department': (row.get('department') or '').strip(),
+                    'section': (row.get('section') or '').strip(),
+                    'photo_path': photos.get(row['photo'].strip())
+                }
+            except (KeyError, AttributeError) as e:
+                fail(row, f"Missing column {e}")
+                continue
+
+            if not student['photo_path']:
+                fail(student, "Photo not found")
+            elif student['roll_id'] in existing_rolls or student['roll_id'] in seen_rolls:
+                fail(student, f"Roll number {student['roll_id']} already exists")
+            else:
+                seen_rolls.add(student['roll_id'])
+                candidates.append(student)
+
+        encoded = self._encode(job, candidates, fail, skipped=len(rows) - len(candidates), total=len(rows))
+
+        job.progress(stage='deduplicating')
+        if encoded:
+            encodings = np.array([encoding for _, encoding in encoded], dtype=np.float32)
+        else:
+            encodings = np.zeros((0, self.face_service.encoding_model.dim), dtype=np.float32)
+        duplicates = find_duplicates(self.face_service.gallery, encodings)
+
+        accepted = []
+        for (student, encoding), duplicate in zip(encoded, duplicates):
+            if isinstance(duplicate, dict):
+                fail(student, f"Face already enrolled for {duplicate['name']} ({duplicate['roll_id']})")
+            elif duplicate is not None:
+                original = encoded[duplicate][0]
+                fail(student, f"Face matches {original['name']} ({original['roll_id']}) in this upload")
+            else:
+                accepted.append((student, encoding))
+
+        # Last point where the job can stop without leaving a partial enrollment
+        job.check_cancelled()
+        job.progress(stage='saving')
+        student_ids = save_students_bulk([
+            (student['name'], student['roll_id'], student['email'], encoding,
+             student['phone'], student['department'], student['section'])
+            for student, encoding in accepted
+        ], encoding_model=self.face_service.encoding_model.name)
+
+        enrolled = []
+        for (student, _), student_id in zip(accepted, student_ids):
+            if student_id is None:
+                fail(student, f"Roll number {student['roll_id']} already exists")
+                continue
+            # Keep the enrollment photo in the student's folder
+            with open(student['photo_path'], 'rb') as f:
+                self.student_db.save_photo(student['roll_id'], f.read())
+            enrolled.append({"name": student['name'], "roll_id": student['roll_id'],
+                             "student_id": student_id, "photo_saved": f"{student['roll_id']}.jpg"})
+
+        # Apply just the newly enrolled students to the gallery
+        self.face_service.sync_gallery()
+        return enrolled, failed
+
+    def _encode(self, job, candidates, fail, skipped, total):
+        """Encode candidate photos across worker processes, reporting progress as they finish"""
+        job.progress(skipped, total, stage='encoding')
+        encoded = [None] * len(candidates)
+        if not candidates:
+            return []
+
+        workers = max(1, min(self.workers, len(candidates)))
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_encoder_worker)
+        try:
+            futures = {executor.submit(_encode_photo, student['photo_path']): index
+                       for index, student in enumerate(candidates)}
+            for done, future in enumerate(as_completed(futures), start=1):
+                job.check_cancelled()
+                index = futures[future]
+                try:
+                    encoding = future.result()
+                except Exception as e:
+                    encoding = None
+                    print(f"❌ Error encoding {candidates[index]['photo_path']}: {e}")
+                if encoding is None:
+                    fail(candidates[index], "No face detected")
+                else:
+                    encoded[index] = (candidates[index], encoding)
+                job.progress(skipped + done)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        # Keep CSV order so duplicates within the upload resolve to the first row
+        return [item for item in encoded if item is not None]
+
+
+class ReembedPipeline:
+    """Re-embedding job handler.
+
+    Students whose stored encoding was made by another encoding model (or,
+    with ``everyone``, all students) are encoded again from their saved
+    enrollment photo with the service's current model, across the same
+    process pool as bulk enrollment. Updates are committed in batches and
+    logged as gallery changes, so running services pick them up; batches
+    committed before a cancellation are kept.
+    """
+
+    def __init__(self, face_service, workers=BULK_ENROLL_WORKERS, batch_size=REEMBED_BATCH_SIZE):
+        self.face_service = face_service
+        self.workers = workers
+        self.batch_size = batch_size
+        self.student_db = StudentDB()
+
+    def __call__(self, job, everyone=False):
+        model = self.face_service.encoding_model
+        job.progress(stage='loading')
+        students = get_students_to_reembed(model.name, everyone)
+        job.progress(0, len(students), stage='encoding')
+
+        failed = []
+        photos = []
+        for student_id, roll_id in students:
+            photo_path = self.student_db.photo_path(roll_id)
+            if photo_path is None:
+                failed.append({"student_id": student_id, "roll_id": roll_id, "error": "Enrollment photo not found"})
+            else:
+                photos.append((student_id, roll_id, photo_path))
+
+        reembedded = 0
+        pending = []
+        if photos:
+            workers = max(1, min(self.workers, len(photos)))
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_encoder_worker)
+            try:
+                futures = {executor.submit(_encode_photo, photo_path): (student_id, roll_id)
+                           for student_id, roll_id, photo_path in photos}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    job.check_cancelled()
+                    student_id, roll_id = futures[future]
+                    try:
+                        encoding = future.result()
+                    except Exception as e:
+                        encoding = None
+                        print(f"❌ Error re-embedding {roll_id}: {e}")
+                    if encoding is None:
+                        failed.append({"student_id": student_id, "roll_id": roll_id, "error": "No face detected"})
+                    else:
+                        pending.append((student_id, encoding))
+                    if len(pending) >= self.batch_size:
+                        update_student_encodings(pending, model.name)
+                        reembedded += len(pending)
+                        pending = []
+                    job.progress(len(students) - len(photos) + done)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        if pending:
+            update_student_encodings(pending, model.name)
+            reembedded += len(pending)
+        self.face_service.sync_gallery()
+
+        return {
+            "message": f"Re-embedded {reembedded} students with {model.name}. Failed: {len(failed)}",
+            "model": model.name,
+            "reembedded": reembedded,
+            "failed": failed,
+            "total_processed": len(students)
+        }
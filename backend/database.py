@@ -1,15 +1,73 @@
 import sqlite3
 import pickle
+import json
+import threading
+import time
 import numpy as np
 import os
 from datetime import datetime, timedelta
+from encoding_format import encode_face_encoding, decode_face_encoding, decode_face_encodings, encoding_blob_size, is_legacy_pickle
+from encoding_models import ENCODING_MODELS, model_for_dimension
+
+# Database file in project root/database folder
+DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
+
+# SQLite statements cached per connection; reused connections keep them prepared
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+def _open_connection():
+    conn = sqlite3.connect(DB_PATH, timeout=30, cached_statements=STATEMENT_CACHE_SIZE)
+    # WAL lets dashboard reads proceed while camera writes commit
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=30000')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+def get_connection():
+    """Connection owned by the calling thread, reopened in forked worker processes"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        return conn
+    
+    conn = _open_connection()
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+def recreate_database():
+    """Drop every table and create a fresh schema
+    
+    The file is reset in place rather than deleted so connections held by
+    other threads and worker processes keep pointing at the live database.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        # Job records outlive a reset; their queues stop the running ones first
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name != 'jobs'")
+        for (table,) in cursor.fetchall():
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        cursor.execute('PRAGMA user_version = 0')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    
+    conn.execute('VACUUM')
+    init_database()
+    invalidate_stats_cache()
 
 def init_database():
-    # Database file in project root/database folder
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    print(f"Database path: {db_path}")
-    conn = sqlite3.connect(db_path)
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    print(f"Database path: {DB_PATH}")
+    conn = get_connection()
     cursor = conn.cursor()
     
     print("Creating database tables...")
@@ -54,200 +112,733 @@ def init_database():
     
     conn.commit()
     print("Database tables created successfully")
-    conn.close()
+    cursor.close()
+    
+    migrate_database(conn)
+
+def _migration_attendance_indexes(cursor):
+    # Keep the earliest mark per student and day so the unique index can be built
+    cursor.execute('''
+        DELETE FROM attendance
+        WHERE id NOT IN (SELECT MIN(id) FROM attendance GROUP BY student_id, date)
+    ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_student_date ON attendance (student_id, date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance (date)')
+
+def _migration_verification_photo_path(cursor):
+    cursor.execute("PRAGMA table_info(id_verifications)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'photo_path' not in columns:
+        cursor.execute('ALTER TABLE id_verifications ADD COLUMN photo_path TEXT')
+
+def _migration_binary_encodings(cursor):
+    # One-time conversion of trusted, locally written pickles to the binary format
+    for table, column in (('students', 'face_encoding'), ('id_verifications', 'id_card_encoding')):
+        rows = cursor.execute(f'SELECT id, {column} FROM {table}').fetchall()
+        converted = []
+        for row_id, blob in rows:
+            if not is_legacy_pickle(blob):
+                continue
+            try:
+                converted.append((encode_face_encoding(pickle.loads(blob)), row_id))
+            except Exception as e:
+                print(f"⚠️ Dropping unreadable {table}.{column} for row {row_id}: {e}")
+                converted.append((None, row_id))
+        cursor.executemany(f'UPDATE {table} SET {column} = ? WHERE id = ?', converted)
 
-def save_student(name, roll_id, email, face_encoding):
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
-    conn = sqlite3.connect(db_path)
+def _migration_gallery_change_log(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS gallery_changes (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    # Identifies this database file so workers notice when it was recreated
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('database_id', lower(hex(randomblob(8))))")
+
+def _migration_jobs(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            stage TEXT,
+            progress_done INTEGER DEFAULT 0,
+            progress_total INTEGER DEFAULT 0,
+            params TEXT,
+            result TEXT,
+            result_path TEXT,
+            error TEXT,
+            cancel_requested INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at)')
+
+def _migration_attendance_counts(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_attendance_counts (
+            date DATE PRIMARY KEY,
+            present INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO daily_attendance_counts (date, present)
+        SELECT date, COUNT(*) FROM attendance GROUP BY date
+    ''')
+    cursor.execute("PRAGMA table_info(students)")
+    if 'attendance_count' not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE students ADD COLUMN attendance_count INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        UPDATE students SET attendance_count = (
+            SELECT COUNT(*) FROM attendance WHERE attendance.student_id = students.id
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_attendance_count ON students (attendance_count)')
+
+def _read_student_info_file(folder):
+    """Fields of the legacy <roll_no>/<Name>.txt info file, or None"""
+    if not os.path.isdir(folder):
+        return None
+    for filename in sorted(os.listdir(folder)):
+        # Alert files live next to the info file
+        if not filename.endswith('.txt') or filename.startswith('alert_'):
+            continue
+        info = {}
+        with open(os.path.join(folder, filename), 'r') as f:
+            for line in f:
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    info[key.strip()] = value.strip()
+        return info
+    return None
+
+def _migration_student_profiles(cursor):
+    cursor.execute("PRAGMA table_info(students)")
+    columns = [column[1] for column in cursor.fetchall()]
+    for column, definition in (('phone', "TEXT DEFAULT ''"), ('department', "TEXT DEFAULT ''"),
+                               ('section', "TEXT DEFAULT ''"), ('status', "TEXT DEFAULT 'Active'"),
+                               ('enrolled_at', 'TEXT')):
+        if column not in columns:
+            cursor.execute(f'ALTER TABLE students ADD COLUMN {column} {definition}')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_department_section ON students (department, section)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_section ON students (section)')
+    
+    # Local time, like the info files; created_at is UTC
+    cursor.execute("UPDATE students SET enrolled_at = datetime(created_at, 'localtime') WHERE enrolled_at IS NULL")
+    
+    # One-time import of the per-student text files written by earlier versions
+    data_dir = os.path.dirname(DB_PATH)
+    imported = []
+    for student_id, roll_id in cursor.execute('SELECT id, roll_id FROM students').fetchall():
+        try:
+            info = _read_student_info_file(os.path.join(data_dir, str(roll_id)))
+        except OSError as e:
+            print(f"⚠️ Could not read info file for {roll_id}: {e}")
+            continue
+        if info:
+            imported.append((info.get('Phone', ''), info.get('Department', ''), info.get('Section', ''),
+                             info.get('Status') or 'Active', info.get('Enrollment Date') or None, student_id))
+    cursor.executemany('''
+        UPDATE students SET phone = ?, department = ?, section = ?, status = ?, enrolled_at = COALESCE(?, enrolled_at)
+        WHERE id = ?
+    ''', imported)
+    if imported:
+        print(f"📁 Imported profile fields for {len(imported)} students from info files")
+
+def _migration_encoding_models(cursor):
+    cursor.execute("PRAGMA table_info(students)")
+    if 'encoding_model' not in [column[1] for column in cursor.fetchall()]:
+        cursor.execute('ALTER TABLE students ADD COLUMN encoding_model TEXT')
+    # Earlier encodings are labelled by their size; sizes no registered model produces stay unlabelled
+    for model in ENCODING_MODELS.values():
+        if model_for_dimension(model.dim) is model:
+            cursor.execute('''
+                UPDATE students SET encoding_model = ?
+                WHERE encoding_model IS NULL AND length(face_encoding) = ?
+            ''', (model.name, encoding_blob_size(model.dim)))
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_encoding_model ON students (encoding_model)')
+
+def _migration_job_owners(cursor):
+    cursor.execute("PRAGMA table_info(jobs)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'owner' not in columns:
+        cursor.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+    if 'heartbeat_at' not in columns:
+        cursor.execute('ALTER TABLE jobs ADD COLUMN heartbeat_at TIMESTAMP')
+
+# Schema migrations in order; PRAGMA user_version stores the last one applied
+MIGRATIONS = [
+    (1, 'attendance (student_id, date) unique index and date index', _migration_attendance_indexes),
+    (2, 'id_verifications.photo_path column', _migration_verification_photo_path),
+    (3, 'pickled face encodings to binary float32', _migration_binary_encodings),
+    (4, 'gallery change log and database id', _migration_gallery_change_log),
+    (5, 'background jobs table', _migration_jobs),
+    (6, 'materialized daily and per-student attendance counts', _migration_attendance_counts),
+    (7, 'student profile columns imported from info files', _migration_student_profiles),
+    (8, 'encoding model recorded per student', _migration_encoding_models),
+    (9, 'job owner and heartbeat columns', _migration_job_owners),
+]
+
+def migrate_database(conn=None):
+    """Apply pending schema migrations, each in its own transaction"""
+    conn = conn or get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        for version, description, migration in MIGRATIONS:
+            # IMMEDIATE takes the write lock so concurrent workers cannot apply the same step twice
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                current = cursor.execute('PRAGMA user_version').fetchone()[0]
+                if current >= version:
+                    conn.rollback()
+                    continue
+                migration(cursor)
+                cursor.execute(f'PRAGMA user_version = {version}')
+                conn.commit()
+                print(f"🛠️ Applied schema migration {version}: {description}")
+            except Exception:
+                conn.rollback()
+                raise
+    finally:
+        cursor.close()
+
+def _encoding_row(face_encoding, encoding_model=None):
+    """Binary encoding and model name to store; the model must be registered and match the size"""
+    values = np.asarray(face_encoding, dtype=np.float32).reshape(-1)
+    model = ENCODING_MODELS.get(encoding_model) if encoding_model else model_for_dimension(values.size)
+    if model is None:
+        raise ValueError(f"No registered encoding model {encoding_model or ''} for {values.size}-dimensional encodings")
+    if model.dim != values.size:
+        raise ValueError(f"Encoding model {model.name} produces {model.dim}-dimensional encodings, not {values.size}")
+    return encode_face_encoding(values), model.name
+
+def save_student(name, roll_id, email, face_encoding, phone='', department='', section='', encoding_model=None):
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
         # Convert face encoding to binary for database storage
-        encoding_blob = pickle.dumps(face_encoding)
+        encoding_blob, encoding_model = _encoding_row(face_encoding, encoding_model)
         
         # Insert student data with face encoding for live cam verification
         cursor.execute('''
-            INSERT INTO students (name, roll_id, email, face_encoding)
-            VALUES (?, ?, ?, ?)
-        ''', (name, roll_id, email, encoding_blob))
+            INSERT INTO students (name, roll_id, email, face_encoding, encoding_model, phone, department, section, enrolled_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (name, roll_id, email, encoding_blob, encoding_model, phone, department, section,
+              datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        student_id = cursor.lastrowid
+        record_gallery_change(cursor, student_id, 'upsert')
         
         conn.commit()
-        student_id = cursor.lastrowid
+        invalidate_stats_cache()
         print(f"✅ Student {name} (Roll: {roll_id}) saved to database with ID: {student_id}")
         return student_id
         
     except sqlite3.IntegrityError:
+        conn.rollback()
         print(f"❌ Roll number {roll_id} already exists")
         raise Exception(f"Roll number {roll_id} already exists")
     finally:
-        conn.close()
+        cursor.close()
 
-def get_all_students():
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
-    conn = sqlite3.connect(db_path)
+def save_students_bulk(students, encoding_model=None):
+    """Insert many students in one transaction
+    
+    students is a list of (name, roll_id, email, face_encoding, phone, department, section) tuples,
+    all encoded by encoding_model. Returns a student id per row, or None where the roll number already exists.
+    """
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute('SELECT id, name, roll_id, email, face_encoding FROM students')
-        students = cursor.fetchall()
+        cursor.execute('BEGIN IMMEDIATE')
+        student_ids = []
+        enrolled_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for name, roll_id, email, face_encoding, phone, department, section in students:
+            encoding_blob, model_name = _encoding_row(face_encoding, encoding_model)
+            cursor.execute('''
+                INSERT OR IGNORE INTO students (name, roll_id, email, face_encoding, encoding_model, phone, department, section, enrolled_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (name, roll_id, email, encoding_blob, model_name, phone, department, section, enrolled_at))
+            if cursor.rowcount == 0:
+                student_ids.append(None)
+                continue
+            student_ids.append(cursor.lastrowid)
+            record_gallery_change(cursor, cursor.lastrowid, 'upsert')
         
-        # Convert binary back to numpy arrays for live cam verification
-        result = []
-        for student in students:
-            id, name, roll_id, email, encoding_blob = student
-            face_encoding = pickle.loads(encoding_blob)
-            result.append({
-                'id': id,
-                'name': name,
-                'roll_id': roll_id,
-                'email': email,
-                'face_encoding': face_encoding
-            })
+        conn.commit()
+        invalidate_stats_cache()
+        print(f"✅ Saved {sum(1 for s in student_ids if s is not None)} students in one transaction")
+        return student_ids
         
-        print(f"📚 Loaded {len(result)} enrolled students for live cam verification")
-        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def get_existing_roll_ids(roll_ids):
+    """Subset of the given roll numbers that are already enrolled"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        existing = set()
+        roll_ids = list(roll_ids)
+        for start in range(0, len(roll_ids), 500):
+            chunk = roll_ids[start:start + 500]
+            cursor.execute(f"SELECT roll_id FROM students WHERE roll_id IN ({','.join('?' * len(chunk))})", chunk)
+            existing.update(row[0] for row in cursor.fetchall())
+        return existing
         
     finally:
-        conn.close()
+        cursor.close()
+
+STUDENT_PROFILE_COLUMNS = ('id', 'name', 'roll_id', 'email', 'phone', 'department', 'section', 'status', 'enrolled_at')
 
-def mark_attendance(student_id):
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
-    conn = sqlite3.connect(db_path)
+def get_student_profile(roll_id):
+    """Contact and class details of one student, without the face encoding"""
+    conn = get_connection()
     cursor = conn.cursor()
     
-    today = datetime.now().strftime('%Y-%m-%d')
-    current_time = datetime.now().strftime('%H:%M:%S')
+    try:
+        cursor.execute(f"SELECT {', '.join(STUDENT_PROFILE_COLUMNS)} FROM students WHERE roll_id = ?", (roll_id,))
+        row = cursor.fetchone()
+        return dict(zip(STUDENT_PROFILE_COLUMNS, row)) if row else None
+        
+    finally:
+        cursor.close()
+
+def get_student_profiles(department=None, section=None):
+    """Profiles of all students, optionally limited to a department and/or section"""
+    conn = get_connection()
+    cursor = conn.cursor()
     
-    # Check if already marked today
-    cursor.execute('''
-        SELECT id FROM attendance 
-        WHERE student_id = ? AND date = ?
-    ''', (student_id, today))
+    try:
+        query = f"SELECT {', '.join(STUDENT_PROFILE_COLUMNS)} FROM students"
+        conditions, params = _class_filter('students', department, section)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        cursor.execute(query + ' ORDER BY id', params)
+        return [dict(zip(STUDENT_PROFILE_COLUMNS, row)) for row in cursor.fetchall()]
+        
+    finally:
+        cursor.close()
+
+def get_absent_students(date, department=None, section=None):
+    """Profiles of students with no attendance on a date, sorted by name
     
-    if cursor.fetchone() is None:
+    A single anti-join against the (student_id, date) index; face encodings are not read.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        conditions, params = _class_filter('s', department, section)
+        cursor.execute(f'''
+            SELECT {', '.join('s.' + column for column in STUDENT_PROFILE_COLUMNS)}
+            FROM students s
+            WHERE NOT EXISTS (SELECT 1 FROM attendance a WHERE a.student_id = s.id AND a.date = ?)
+            {''.join(' AND ' + condition for condition in conditions)}
+            ORDER BY s.name
+        ''', (date, *params))
+        return [dict(zip(STUDENT_PROFILE_COLUMNS, row)) for row in cursor.fetchall()]
+        
+    finally:
+        cursor.close()
+
+def get_class_student_ids(department=None, section=None, roll_ids=None):
+    """Ids of the students in a department/section and/or an explicit roster of roll numbers"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        conditions, params = _class_filter('students', department, section)
+        if roll_ids is not None:
+            roll_ids = list(roll_ids)
+            conditions.append(f"students.roll_id IN ({', '.join('?' * len(roll_ids))})" if roll_ids else '0')
+            params.extend(roll_ids)
+        query = 'SELECT id FROM students'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        cursor.execute(query, params)
+        return [row[0] for row in cursor.fetchall()]
+        
+    finally:
+        cursor.close()
+
+def _class_filter(alias, department=None, section=None):
+    conditions = []
+    params = []
+    if department:
+        conditions.append(f'{alias}.department = ?')
+        params.append(department)
+    if section:
+        conditions.append(f'{alias}.section = ?')
+        params.append(section)
+    return conditions, params
+
+def record_gallery_change(cursor, student_id, op):
+    """Append to the gallery change log inside the caller's transaction ('upsert' or 'delete')"""
+    cursor.execute('INSERT INTO gallery_changes (student_id, op) VALUES (?, ?)', (student_id, op))
+
+def get_gallery_state():
+    """(database id, latest gallery change version) - cheap enough to poll"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
         cursor.execute('''
-            INSERT INTO attendance (student_id, date, time)
-            VALUES (?, ?, ?)
-        ''', (student_id, today, current_time))
+            SELECT (SELECT value FROM settings WHERE key = 'database_id'),
+                   COALESCE((SELECT MAX(version) FROM gallery_changes), 0)
+        ''')
+        return cursor.fetchone()
+        
+    finally:
+        cursor.close()
+
+def get_gallery_changes(since_version):
+    """Latest change per student after a version, as {student_id: op}"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('''
+            SELECT student_id, op FROM gallery_changes
+            WHERE version > ?
+            ORDER BY version
+        ''', (since_version,))
+        return dict(cursor.fetchall())
+        
+    finally:
+        cursor.close()
+
+def get_gallery_encodings(model, student_ids=None):
+    """Ids, names, roll numbers and an (n, model.dim) encoding matrix for students encoded by a model
+    
+    Loads every student unless student_ids restricts it to a delta.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        query = '''
+            SELECT id, name, roll_id, face_encoding FROM students
+            WHERE encoding_model = ? AND length(face_encoding) = ?
+        '''
+        params = (model.name, encoding_blob_size(model.dim))
+        if student_ids is None:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        else:
+            rows = []
+            student_ids = list(student_ids)
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(student_ids), 500):
+                chunk = student_ids[start:start + 500]
+                cursor.execute(query + f" AND id IN ({','.join('?' * len(chunk))})", (*params, *chunk))
+                rows.extend(cursor.fetchall())
+        
+        ids = [row[0] for row in rows]
+        names = [row[1] for row in rows]
+        rolls = [row[2] for row in rows]
+        encodings = decode_face_encodings([row[3] for row in rows], model.dim)
+        
+        if student_ids is None:
+            print(f"📚 Loaded {len(ids)} enrolled students for live cam verification")
+        return ids, names, rolls, encodings
+        
+    finally:
+        cursor.close()
+
+def get_encoding_model_counts():
+    """Enrolled students per encoding model, as {model name or None: count}"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('SELECT encoding_model, COUNT(*) FROM students GROUP BY encoding_model')
+        return dict(cursor.fetchall())
+        
+    finally:
+        cursor.close()
+
+def get_students_to_reembed(model_name, include_current=False):
+    """(id, roll_id) of students whose encoding was not made by a model, or of every student"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        if include_current:
+            cursor.execute('SELECT id, roll_id FROM students ORDER BY id')
+        else:
+            cursor.execute('''
+                SELECT id, roll_id FROM students
+                WHERE encoding_model IS NULL OR encoding_model != ?
+                ORDER BY id
+            ''', (model_name,))
+        return cursor.fetchall()
+        
+    finally:
+        cursor.close()
+
+def update_student_encodings(updates, encoding_model):
+    """Replace (student_id, face_encoding) pairs in one transaction and log them as gallery changes"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        for student_id, face_encoding in updates:
+            encoding_blob, model_name = _encoding_row(face_encoding, encoding_model)
+            cursor.execute('UPDATE students SET face_encoding = ?, encoding_model = ? WHERE id = ?',
+                           (encoding_blob, model_name, student_id))
+            if cursor.rowcount:
+                record_gallery_change(cursor, student_id, 'upsert')
         conn.commit()
-        print(f"✅ Student {student_id} marked present at {current_time}")
-        conn.close()
-        return True
+        
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def _insert_attendance(cursor, records):
+    """Insert (student_id, date, time) records and keep the materialized counts in step
     
-    print(f"⚠️ Student {student_id} already marked present today")
-    conn.close()
-    return False
+    Returns how many records were new; students already marked that day are skipped.
+    """
+    inserted = []
+    for record in records:
+        # The unique (student_id, date) index turns repeat marks into no-ops
+        cursor.execute('''
+            INSERT OR IGNORE INTO attendance (student_id, date, time)
+            VALUES (?, ?, ?)
+        ''', record)
+        if cursor.rowcount == 1:
+            inserted.append(record)
+    
+    per_day = {}
+    for student_id, date, _ in inserted:
+        per_day[date] = per_day.get(date, 0) + 1
+    cursor.executemany('''
+        INSERT INTO daily_attendance_counts (date, present) VALUES (?, ?)
+        ON CONFLICT (date) DO UPDATE SET present = present + excluded.present
+    ''', per_day.items())
+    cursor.executemany('UPDATE students SET attendance_count = attendance_count + 1 WHERE id = ?',
+                       [(student_id,) for student_id, _, _ in inserted])
+    return len(inserted)
 
-def get_attendance_stats():
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
-    conn = sqlite3.connect(db_path)
+def get_marked_student_ids(date):
+    """Ids of students already marked present on a date"""
+    conn = get_connection()
     cursor = conn.cursor()
     
-    today = datetime.now().strftime('%Y-%m-%d')
+    try:
+        cursor.execute('SELECT DISTINCT student_id FROM attendance WHERE date = ?', (date,))
+        return {row[0] for row in cursor.fetchall()}
+        
+    finally:
+        cursor.close()
+
+def get_database_id():
+    """Random id of this database file, regenerated whenever it is recreated"""
+    conn = get_connection()
+    cursor = conn.cursor()
     
-    # Present today
-    cursor.execute('''
-        SELECT COUNT(*) FROM attendance WHERE date = ?
-    ''', (today,))
-    present_today = cursor.fetchone()[0]
+    try:
+        cursor.execute("SELECT value FROM settings WHERE key = 'database_id'")
+        row = cursor.fetchone()
+        return row[0] if row else None
+        
+    finally:
+        cursor.close()
+
+def save_attendance_batch(records, database_id=None):
+    """Insert (student_id, date, time) records in one transaction, skipping students already marked that day
     
-    # Total students
-    cursor.execute('SELECT COUNT(*) FROM students')
-    total_students = cursor.fetchone()[0]
+    With a database_id, records are dropped (returning None) when the database was recreated since they
+    were made; their student ids belong to the old database.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
     
-    # Absent today
-    absent_today = total_students - present_today
+    try:
+        # IMMEDIATE so a reset cannot recreate the database between the check and the inserts
+        cursor.execute('BEGIN IMMEDIATE')
+        if database_id is not None:
+            cursor.execute("SELECT value FROM settings WHERE key = 'database_id'")
+            row = cursor.fetchone()
+            if row is None or row[0] != database_id:
+                conn.rollback()
+                return None
+        inserted = _insert_attendance(cursor, records)
+        conn.commit()
+        if inserted:
+            invalidate_stats_cache()
+        return inserted
+        
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+# Dashboard statistics are served from memory for this many seconds; marks made in
+# this process invalidate them immediately, marks from worker processes within the TTL
+STATS_CACHE_TTL = float(os.environ.get("STATS_CACHE_TTL", 5.0))
+_stats_cache = {'key': None, 'expires': 0.0, 'value': None}
+_stats_cache_lock = threading.Lock()
+
+def invalidate_stats_cache():
+    with _stats_cache_lock:
+        _stats_cache['expires'] = 0.0
+
+def get_attendance_stats():
+    """Dashboard statistics, cached for STATS_CACHE_TTL seconds"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    
+    with _stats_cache_lock:
+        if _stats_cache['key'] == today and time.monotonic() < _stats_cache['expires']:
+            return _stats_cache['value']
+    
+    stats = _compute_attendance_stats(today)
     
-    # Attendance rate
-    attendance_rate = (present_today / total_students * 100) if total_students > 0 else 0
+    with _stats_cache_lock:
+        _stats_cache.update(key=today, expires=time.monotonic() + STATS_CACHE_TTL, value=stats)
+    return stats
+
+def get_stats_fingerprint():
+    """Cheap marker that changes whenever the dashboard statistics could change"""
+    conn = get_connection()
+    cursor = conn.cursor()
     
-    # Weekly trend (last 7 days)
-    weekly_trend = []
-    for i in range(6, -1, -1):
-        date = (datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d')
+    try:
         cursor.execute('''
-            SELECT COUNT(*) FROM attendance WHERE date = ?
-        ''', (date,))
-        count = cursor.fetchone()[0]
-        rate = (count / total_students * 100) if total_students > 0 else 0
-        weekly_trend.append({
-            'date': date,
-            'attendance': count,
-            'rate': round(rate, 1)
-        })
-    
-    # Top students (most active)
-    cursor.execute('''
-        SELECT s.name, s.roll_id, COUNT(a.id) as attendance_count
-        FROM students s
-        LEFT JOIN attendance a ON s.id = a.student_id
-        GROUP BY s.id, s.name, s.roll_id
-        ORDER BY attendance_count DESC
-        LIMIT 5
-    ''')
+            SELECT (SELECT COALESCE(MAX(id), 0) FROM attendance),
+                   (SELECT COALESCE(MAX(id), 0) FROM students),
+                   (SELECT COUNT(*) FROM students),
+                   (SELECT value FROM settings WHERE key = 'database_id')
+        ''')
+        return (datetime.now().strftime('%Y-%m-%d'),) + tuple(cursor.fetchone())
+        
+    finally:
+        cursor.close()
+
+def _compute_attendance_stats(today):
+    conn = get_connection()
+    cursor = conn.cursor()
     
-    top_students = cursor.fetchall()
-    top_users = []
-    for student in top_students:
-        name, roll_id, count = student
-        top_users.append({
-            'name': name,
-            'roll_id': roll_id,
-            'attendance_count': count,
-            'attendance_rate': round((count / 30 * 100), 1) if count > 0 else 0  # Assuming 30 days max
-        })
-    
-    conn.close()
-    
-    return {
-        'today_present': present_today,
-        'absent_count': absent_today,
-        'total_users': total_students,
-        'attendance_rate': round(attendance_rate, 1),
-        'weekly_trend': weekly_trend,
-        'top_users': top_users
-    }
+    try:
+        # Total students and present today
+        cursor.execute('''
+            SELECT (SELECT COUNT(*) FROM students),
+                   COALESCE((SELECT present FROM daily_attendance_counts WHERE date = ?), 0)
+        ''', (today,))
+        total_students, present_today = cursor.fetchone()
+        
+        # Absent today
+        absent_today = total_students - present_today
+        
+        # Attendance rate
+        attendance_rate = (present_today / total_students * 100) if total_students > 0 else 0
+        
+        # Weekly trend (last 7 days) from the materialized per-day counts
+        week = [(datetime.strptime(today, '%Y-%m-%d') - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
+        cursor.execute('''
+            SELECT date, present FROM daily_attendance_counts
+            WHERE date BETWEEN ? AND ?
+        ''', (week[0], week[-1]))
+        counts = dict(cursor.fetchall())
+        
+        weekly_trend = []
+        for date in week:
+            count = counts.get(date, 0)
+            rate = (count / total_students * 100) if total_students > 0 else 0
+            weekly_trend.append({
+                'date': date,
+                'attendance': count,
+                'rate': round(rate, 1)
+            })
+        
+        # Top students (most active)
+        cursor.execute('''
+            SELECT name, roll_id, attendance_count
+            FROM students
+            ORDER BY attendance_count DESC
+            LIMIT 5
+        ''')
+        
+        top_students = cursor.fetchall()
+        top_users = []
+        for student in top_students:
+            name, roll_id, count = student
+            top_users.append({
+                'name': name,
+                'roll_id': roll_id,
+                'attendance_count': count,
+                'attendance_rate': round((count / 30 * 100), 1) if count > 0 else 0  # Assuming 30 days max
+            })
+        
+        return {
+            'today_present': present_today,
+            'absent_count': absent_today,
+            'total_users': total_students,
+            'attendance_rate': round(attendance_rate, 1),
+            'weekly_trend': weekly_trend,
+            'top_users': top_users
+        }
+        
+    finally:
+        cursor.close()
 
 def get_student_by_roll_id(roll_id):
     """Get student by roll number"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute('SELECT id, name, roll_id, email, face_encoding FROM students WHERE roll_id = ?', (roll_id,))
+        cursor.execute('''
+            SELECT id, name, roll_id, email, face_encoding, encoding_model FROM students WHERE roll_id = ?
+        ''', (roll_id,))
         student = cursor.fetchone()
         
         if student:
-            id, name, roll_id, email, encoding_blob = student
-            face_encoding = pickle.loads(encoding_blob)
+            id, name, roll_id, email, encoding_blob, encoding_model = student
+            face_encoding = decode_face_encoding(encoding_blob)
             return {
                 'id': id,
                 'name': name,
                 'roll_id': roll_id,
                 'email': email,
-                'face_encoding': face_encoding
+                'face_encoding': face_encoding,
+                'encoding_model': encoding_model
             }
         return None
         
     finally:
-        conn.close()
+        cursor.close()
 
 def save_id_card_verification(student_id, roll_number, id_card_encoding, is_verified, face_distance, photo_path=None):
     """Save ID card verification result with photo path"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
-    conn = sqlite3.connect(db_path)
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
         # Convert face encoding to binary
-        encoding_blob = pickle.dumps(id_card_encoding)
-        
-        # Add photo_path column if not exists
-        cursor.execute("PRAGMA table_info(id_verifications)")
-        columns = [column[1] for column in cursor.fetchall()]
-        if 'photo_path' not in columns:
-            cursor.execute('ALTER TABLE id_verifications ADD COLUMN photo_path TEXT')
+        encoding_blob = encode_face_encoding(id_card_encoding)
         
         cursor.execute('''
             INSERT INTO id_verifications (student_id, roll_number, id_card_encoding, is_verified, face_distance, photo_path)
@@ -262,64 +853,260 @@ def save_id_card_verification(student_id, roll_number, id_card_encoding, is_veri
         
         return verification_id
         
+    except Exception:
+        conn.rollback()
+        raise
     finally:
-        conn.close()
+        cursor.close()
 
-def get_all_id_verifications():
-    """Get all ID card verifications for duplicate checking"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
-    conn = sqlite3.connect(db_path)
+def get_attendance_summary(date, department=None, section=None):
+    """(total students, students present) for a date, optionally for one department/section"""
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute('''
-            SELECT iv.student_id, iv.roll_number, iv.id_card_encoding, s.name
-            FROM id_verifications iv
-            JOIN students s ON iv.student_id = s.id
-        ''')
+        if not department and not section:
+            cursor.execute('''
+                SELECT (SELECT COUNT(*) FROM students),
+                       COALESCE((SELECT present FROM daily_attendance_counts WHERE date = ?), 0)
+            ''', (date,))
+            return cursor.fetchone()
         
-        verifications = cursor.fetchall()
-        
-        result = []
-        for verification in verifications:
-            student_id, roll_number, encoding_blob, student_name = verification
-            id_card_encoding = pickle.loads(encoding_blob)
-            result.append({
-                'student_id': student_id,
-                'roll_number': roll_number,
-                'id_card_encoding': id_card_encoding,
-                'student_name': student_name
-            })
+        conditions, params = _class_filter('s', department, section)
+        cursor.execute(f'''
+            SELECT COUNT(*),
+                   COUNT(a.id)
+            FROM students s
+            LEFT JOIN attendance a ON a.student_id = s.id AND a.date = ?
+            WHERE {' AND '.join(conditions)}
+        ''', (date, *params))
+        return cursor.fetchone()
         
-        return result
+    finally:
+        cursor.close()
+
+def iter_attendance_report(date, include_present=True, include_absent=True, department=None, section=None,
+                           batch_size=500):
+    """Yield (name, roll_id, email, phone, department, section, status, time) report rows for a date
+    
+    Present students come first in marking order, then absent students in
+    enrollment order. Rows are streamed from the cursor and face encodings
+    are never read.
+    """
+    conditions, class_params = _class_filter('s', department, section)
+    class_filter = ''.join(f' AND {condition}' for condition in conditions)
+    
+    parts = []
+    params = []
+    if include_present:
+        parts.append(f'''
+            SELECT s.name, s.roll_id, s.email, s.phone, s.department, s.section, 'Present', a.time
+            FROM attendance a
+            JOIN students s ON s.id = a.student_id
+            WHERE a.date = ?{class_filter}
+        ''')
+        params.extend((date, *class_params))
+    if include_absent:
+        parts.append(f'''
+            SELECT s.name, s.roll_id, s.email, s.phone, s.department, s.section, 'Absent', '-'
+            FROM students s
+            WHERE NOT EXISTS (SELECT 1 FROM attendance a WHERE a.student_id = s.id AND a.date = ?){class_filter}
+        ''')
+        params.extend((date, *class_params))
+    if not parts:
+        return
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(' UNION ALL '.join(parts), params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
         
     finally:
-        conn.close()
+        cursor.close()
 
-def get_present_students_by_date(date):
-    """Get students present on a specific date"""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'attendance.db')
-    conn = sqlite3.connect(db_path)
+JOB_COLUMNS = ('id', 'kind', 'status', 'stage', 'progress_done', 'progress_total', 'params', 'result',
+               'result_path', 'error', 'cancel_requested', 'created_at', 'started_at', 'finished_at',
+               'owner', 'heartbeat_at')
+
+def create_job(job_id, kind, params, owner=None):
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
         cursor.execute('''
-            SELECT student_id, date, time FROM attendance 
-            WHERE date = ?
-        ''', (date,))
+            INSERT INTO jobs (id, kind, params, owner, heartbeat_at) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (job_id, kind, json.dumps(params), owner))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def update_job(job_id, **fields):
+    """Set job columns; result is stored as JSON and the *_at columns accept 'now'"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        assignments = []
+        values = []
+        for column, value in fields.items():
+            if column not in JOB_COLUMNS:
+                raise ValueError(f"Unknown job column: {column}")
+            if column.endswith('_at') and value == 'now':
+                assignments.append(f'{column} = CURRENT_TIMESTAMP')
+                continue
+            if column == 'result':
+                value = json.dumps(value)
+            assignments.append(f'{column} = ?')
+            values.append(value)
+        cursor.execute(f"UPDATE jobs SET {', '.join(assignments)} WHERE id = ?", (*values, job_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def _job_from_row(row):
+    job = dict(zip(JOB_COLUMNS, row))
+    job['params'] = json.loads(job['params']) if job['params'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+def get_job(job_id):
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+        row = cursor.fetchone()
+        return _job_from_row(row) if row else None
         
-        present_students = cursor.fetchall()
+    finally:
+        cursor.close()
+
+def get_recent_jobs(kind=None, limit=50):
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        query = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs"
+        params = []
+        if kind:
+            query += ' WHERE kind = ?'
+            params.append(kind)
+        query += ' ORDER BY created_at DESC, rowid DESC LIMIT ?'
+        params.append(limit)
+        cursor.execute(query, params)
+        return [_job_from_row(row) for row in cursor.fetchall()]
         
-        result = []
-        for student in present_students:
-            student_id, date, time = student
-            result.append({
-                'student_id': student_id,
-                'date': date,
-                'time': time
-            })
+    finally:
+        cursor.close()
+
+def is_job_cancel_requested(job_id):
+    """Whether cancellation was requested, possibly through another worker process"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        return bool(row and row[0])
         
-        return result
+    finally:
+        cursor.close()
+
+def request_cancel_unfinished_jobs():
+    """Flag every queued or running job for cancellation, whichever process runs it"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("UPDATE jobs SET cancel_requested = 1 WHERE status IN ('queued', 'running')")
+        conn.commit()
+        return cursor.rowcount
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def count_unfinished_jobs():
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')")
+        return cursor.fetchone()[0]
         
     finally:
-        conn.close()
\ No newline at end of file
+        cursor.close()
+
+def touch_jobs(owner):
+    """Refresh the heartbeat of the unfinished jobs a queue owns"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('''
+            UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP
+            WHERE owner = ? AND status IN ('queued', 'running')
+        ''', (owner,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def fail_interrupted_jobs(stale_after_seconds):
+    """Unfinished jobs whose owner stopped sending heartbeats can never finish
+    
+    Jobs of queues in other live worker processes keep fresh heartbeats and are left alone.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('''
+            UPDATE jobs SET status = 'failed', error = 'Interrupted: the server process running it stopped', finished_at = CURRENT_TIMESTAMP
+            WHERE status IN ('queued', 'running')
+              AND (heartbeat_at IS NULL OR heartbeat_at < datetime('now', ?))
+        ''', (f'-{int(stale_after_seconds)} seconds',))
+        conn.commit()
+        return cursor.rowcount
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def delete_finished_jobs(older_than_seconds):
+    """Remove old finished job records, returning their ids so their files can be cleaned up"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cutoff = f'-{int(older_than_seconds)} seconds'
+        cursor.execute('''
+            SELECT id FROM jobs
+            WHERE status IN ('completed', 'failed', 'cancelled') AND finished_at < datetime('now', ?)
+        ''', (cutoff,))
+        job_ids = [row[0] for row in cursor.fetchall()]
+        cursor.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in job_ids])
+        conn.commit()
+        return job_ids
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
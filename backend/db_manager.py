@@ -1,25 +1,26 @@
 import os
 from datetime import datetime
 from pathlib import Path
+from database import DB_PATH, get_student_profile
+
+def student_info_from_profile(profile):
+    """Student profile row in the labelled form used by alerts"""
+    return {
+        'Student Name': profile['name'],
+        'Roll Number': profile['roll_id'],
+        'Email': profile['email'] or '',
+        'Phone': profile['phone'] or '',
+        'Department': profile['department'] or '',
+        'Section': profile['section'] or '',
+        'Enrollment Date': profile['enrolled_at'],
+        'Status': profile['status'] or 'Active'
+    }
 
 class StudentDB:
-    def __init__(self):
-        self.db_path = Path("../database")
+    """Per-student photo folders; contact and class details live in the students table"""
     
-    def create_student(self, roll_no, name, email, phone="", dept="", section=""):
-        folder = self.db_path / str(roll_no)
-        folder.mkdir(exist_ok=True)
-        
-        info_file = folder / f"{name.replace(' ', '_')}.txt"
-        with open(info_file, 'w') as f:
-            f.write(f"Student Name: {name}\n")
-            f.write(f"Roll Number: {roll_no}\n")
-            f.write(f"Email: {email}\n")
-            f.write(f"Phone: {phone}\n")
-            f.write(f"Department: {dept}\n")
-            f.write(f"Section: {section}\n")
-            f.write(f"Enrollment Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Status: Active\n")
+    def __init__(self):
+        self.db_path = Path(os.path.dirname(DB_PATH))
     
     def save_photo(self, roll_no, photo_data):
         folder = self.db_path / str(roll_no)
@@ -28,6 +29,11 @@ class StudentDB:
         with open(photo_path, 'wb') as f:
             f.write(photo_data)
     
+    def photo_path(self, roll_no):
+        """Path of the stored enrollment photo, or None when there is none"""
+        photo_path = self.db_path / str(roll_no) / f"{roll_no}.jpg"
+        return str(photo_path) if photo_path.is_file() else None
+    
     def save_idcard(self, roll_no, idcard_data):
         folder = self.db_path / str(roll_no)
         folder.mkdir(exist_ok=True)
@@ -35,53 +41,20 @@ class StudentDB:
         with open(idcard_path, 'wb') as f:
             f.write(idcard_data)
     
-    def update_attendance(self, roll_no):
-        folder = self.db_path / str(roll_no)
-        if not folder.exists():
-            return False
-        
-        for txt_file in folder.glob("*.txt"):
-            with open(txt_file, 'r') as f:
-                lines = f.readlines()
-            
-            updated = False
-            for i, line in enumerate(lines):
-                if line.startswith("Last Attendance:"):
-                    lines[i] = f"Last Attendance: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
-                    updated = True
-                    break
-            
-            if not updated:
-                lines.append(f"Last Attendance: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            
-            with open(txt_file, 'w') as f:
-                f.writelines(lines)
-            return True
-        return False
-    
     def get_student_info(self, roll_no):
-        folder = self.db_path / str(roll_no)
-        if not folder.exists():
-            return None
-        
-        for txt_file in folder.glob("*.txt"):
-            with open(txt_file, 'r') as f:
-                content = f.read()
-            info = {}
-            for line in content.strip().split('\n'):
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    info[key.strip()] = value.strip()
-            return info
-        return None
+        profile = get_student_profile(roll_no)
+        return student_info_from_profile(profile) if profile else None
     
     def create_alert(self, roll_no, date, reason="Absent"):
         folder = self.db_path / str(roll_no)
         if not folder.exists():
             return False
         
-        alert_file = folder / f"alert_{date}.txt"
         student_info = self.get_student_info(roll_no)
+        if student_info is None:
+            return False
+        
+        alert_file = folder / f"alert_{date}.txt"
         
         with open(alert_file, 'w') as f:
             f.write(f"ATTENDANCE ALERT - {date}\n")
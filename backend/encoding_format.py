@@ -0,0 +1,59 @@
+import struct
+import numpy as np
+
+# Stored face encodings: an 8-byte header followed by little-endian float32 values
+#   magic b'FE' | format version (u8) | value type (u8, 1 = float32) | dimension (u32 LE)
+ENCODING_MAGIC = b'FE'
+ENCODING_VERSION = 1
+ENCODING_FLOAT32 = 1
+HEADER = struct.Struct('<2sBBI')
+
+
+def encoding_blob_size(dim):
+    return HEADER.size + 4 * dim
+
+
+def _row_dtype(dim):
+    return np.dtype([
+        ('magic', 'S2'),
+        ('version', 'u1'),
+        ('value_type', 'u1'),
+        ('dim', '<u4'),
+        ('values', '<f4', (dim,))
+    ])
+
+
+def encode_face_encoding(encoding):
+    """Serialize a face encoding to the fixed-width binary format"""
+    values = np.asarray(encoding, dtype='<f4').reshape(-1)
+    return HEADER.pack(ENCODING_MAGIC, ENCODING_VERSION, ENCODING_FLOAT32, values.size) + values.tobytes()
+
+
+def decode_face_encoding(blob):
+    """Deserialize one stored encoding; None for missing values"""
+    if blob is None:
+        return None
+    magic, version, value_type, dim = HEADER.unpack_from(blob)
+    if magic != ENCODING_MAGIC or version != ENCODING_VERSION or value_type != ENCODING_FLOAT32:
+        raise ValueError("Unrecognized face encoding format")
+    if len(blob) != encoding_blob_size(dim):
+        raise ValueError(f"Face encoding blob has {len(blob)} bytes, expected {encoding_blob_size(dim)}")
+    return np.frombuffer(blob, dtype='<f4', offset=HEADER.size).astype(np.float32)
+
+
+def decode_face_encodings(blobs, dim):
+    """Decode many same-dimension blobs with one np.frombuffer into an (n, dim) float32 matrix"""
+    if not blobs:
+        return np.zeros((0, dim), dtype=np.float32)
+
+    rows = np.frombuffer(b''.join(blobs), dtype=_row_dtype(dim))
+    valid = (rows['magic'] == ENCODING_MAGIC) & (rows['version'] == ENCODING_VERSION) \
+        & (rows['value_type'] == ENCODING_FLOAT32) & (rows['dim'] == dim)
+    if not valid.all():
+        raise ValueError("Unrecognized face encoding format")
+    return rows['values'].astype(np.float32)
+
+
+def is_legacy_pickle(blob):
+    """Encodings written before the binary format were pickled numpy arrays"""
+    return blob is not None and blob[:1] == b'\x80'
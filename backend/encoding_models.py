@@ -0,0 +1,37 @@
+# Registry of the face encoders whose vectors can be stored. Every stored
+# encoding records the model that produced it; only encodings of the model a
+# service runs are loaded into its gallery, so vectors of different models
+# (or dimensions) are never compared with each other.
+
+
+class EncodingModel:
+    """A face encoder: its stored name, vector size and distance metric"""
+
+    def __init__(self, name, dim, metric, description):
+        self.name = name
+        self.dim = dim
+        self.metric = metric
+        self.description = description
+
+    def __repr__(self):
+        return f"EncodingModel({self.name!r}, dim={self.dim}, metric={self.metric!r})"
+
+
+DLIB_RESNET = EncodingModel('dlib_resnet_128', 128, 'euclidean', 'face_recognition (dlib ResNet) embedding')
+OPENCV_HISTOGRAM = EncodingModel('opencv_hist_grad_66', 66, 'cosine', 'OpenCV gray histogram and Sobel gradient features')
+
+ENCODING_MODELS = {model.name: model for model in (DLIB_RESNET, OPENCV_HISTOGRAM)}
+
+
+def get_encoding_model(name):
+    """Registered model by name; raises KeyError for an unknown model"""
+    return ENCODING_MODELS[name]
+
+
+def model_for_dimension(dim):
+    """The registered model producing dim-sized vectors, or None
+
+    Only used to label encodings stored before the model was recorded.
+    """
+    matches = [model for model in ENCODING_MODELS.values() if model.dim == dim]
+    return matches[0] if len(matches) == 1 else None
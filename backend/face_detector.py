@@ -0,0 +1,80 @@
+import os
+import cv2
+
+# Detection front-end configuration. Faces are found on a downscaled copy of
+# the frame and only their boxes are mapped back, so embeddings still see
+# full-resolution pixels.
+DETECTION_MAX_WIDTH = int(os.environ.get("DETECTION_MAX_WIDTH", 640))
+# Smallest face side, in full-resolution pixels, that must still be detected;
+# frames are never shrunk so far that such a face drops below the detector's window
+DETECTION_MIN_FACE_SIZE = int(os.environ.get("DETECTION_MIN_FACE_SIZE", 60))
+# Haar pyramid step between scales: larger is faster but can miss faces between scales
+DETECTION_SCALE_STEP = float(os.environ.get("DETECTION_SCALE_STEP", 1.1))
+DETECTION_MIN_NEIGHBORS = int(os.environ.get("DETECTION_MIN_NEIGHBORS", 4))
+# dlib HOG upsampling passes; each halves the smallest detectable face and roughly quadruples the cost
+DETECTION_UPSAMPLE = int(os.environ.get("DETECTION_UPSAMPLE", 1))
+
+# Smallest face each detector finds at native scale
+HAAR_WINDOW = 24
+HOG_WINDOW = 80
+
+
+def detection_scale(width, detector_window, max_width=DETECTION_MAX_WIDTH, min_face_size=DETECTION_MIN_FACE_SIZE):
+    """Factor (<= 1) applied to a frame before detection"""
+    scale = min(1.0, max_width / width) if max_width > 0 else 1.0
+    if min_face_size > 0:
+        scale = max(scale, detector_window / min_face_size)
+    return min(scale, 1.0)
+
+
+def downscale(image, scale):
+    if scale >= 1.0:
+        return image
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def scale_boxes(boxes, scale, shape):
+    """Map (top, right, bottom, left) boxes from the detection copy to full-frame pixels"""
+    height, width = shape[:2]
+    return [(max(0, int(round(top / scale))), min(width, int(round(right / scale))),
+             min(height, int(round(bottom / scale))), max(0, int(round(left / scale))))
+            for top, right, bottom, left in boxes]
+
+
+class HaarFaceDetector:
+    """OpenCV Haar cascade run on a downscaled grayscale copy of BGR frames"""
+
+    def __init__(self, max_width=DETECTION_MAX_WIDTH, min_face_size=DETECTION_MIN_FACE_SIZE,
+                 scale_step=DETECTION_SCALE_STEP, min_neighbors=DETECTION_MIN_NEIGHBORS):
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.max_width = max_width
+        self.min_face_size = min_face_size
+        self.scale_step = scale_step
+        self.min_neighbors = min_neighbors
+
+    def detect(self, frame):
+        """Face boxes as (top, right, bottom, left) in full-resolution pixels"""
+        scale = detection_scale(frame.shape[1], HAAR_WINDOW, self.max_width, self.min_face_size)
+        gray = cv2.cvtColor(downscale(frame, scale), cv2.COLOR_BGR2GRAY)
+        min_size = max(HAAR_WINDOW, int(self.min_face_size * scale))
+        faces = self.cascade.detectMultiScale(gray, self.scale_step, self.min_neighbors, minSize=(min_size, min_size))
+        return scale_boxes([(y, x + w, y + h, x) for x, y, w, h in faces], scale, frame.shape)
+
+
+class HogFaceDetector:
+    """dlib HOG detector from face_recognition run on a downscaled copy of RGB frames"""
+
+    def __init__(self, max_width=DETECTION_MAX_WIDTH, min_face_size=DETECTION_MIN_FACE_SIZE,
+                 upsample=DETECTION_UPSAMPLE):
+        import face_recognition
+        self._face_locations = face_recognition.face_locations
+        self.max_width = max_width
+        self.min_face_size = min_face_size
+        self.upsample = upsample
+
+    def detect(self, rgb_frame):
+        """Face boxes as (top, right, bottom, left) in full-resolution pixels"""
+        window = HOG_WINDOW / 2 ** self.upsample
+        scale = detection_scale(rgb_frame.shape[1], window, self.max_width, self.min_face_size)
+        boxes = self._face_locations(downscale(rgb_frame, scale), number_of_times_to_upsample=self.upsample)
+        return scale_boxes(boxes, scale, rgb_frame.shape)
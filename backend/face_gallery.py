@@ -0,0 +1,269 @@
+import threading
+import numpy as np
+
+
+class GalleryView:
+    """Immutable snapshot of the gallery rows.
+
+    Rows of ``matrix`` are unit-length encodings; the original vector norms are
+    kept in ``norms`` so euclidean distances (what face_recognition uses) can be
+    recovered from the same matrix multiply that gives cosine similarity.
+    Student ids, names and roll numbers live in parallel arrays indexed by row.
+    Queries that hold a view keep using it, so they never observe a
+    half-applied gallery update. ``index`` is an approximate search structure
+    over the rows, or None when every query scans the whole matrix.
+    """
+
+    def __init__(self, metric, dim, matrix, norms, ids, names, rolls, index=None):
+        self.metric = metric
+        self.dim = dim
+        self.matrix = matrix
+        self.norms = norms
+        self.ids = ids
+        self.names = names
+        self.rolls = rolls
+        self.index = index
+
+    def __len__(self):
+        return len(self.ids)
+
+    def accepts(self, dim):
+        """True when probes of this dimension can be matched against the gallery"""
+        return len(self) > 0 and dim == self.dim
+
+    def distances(self, probes, rows=None):
+        """Distance matrix of shape (n_probes, n_gallery) from a single matrix multiply
+
+        ``rows`` restricts the columns to those gallery rows, in the given order.
+        """
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        if probes.shape[1] != self.dim:
+            raise ValueError(f"Probe dimension {probes.shape[1]} does not match gallery dimension {self.dim}")
+
+        matrix, norms = (self.matrix, self.norms) if rows is None else (self.matrix[rows], self.norms[rows])
+        unit_probes, probe_norms = normalize_rows(probes)
+        similarity = unit_probes @ matrix.T
+
+        if self.metric == 'cosine':
+            return 1.0 - similarity
+
+        # |a - b|^2 = |a|^2 + |b|^2 - 2|a||b|cos(a, b)
+        squared = (probe_norms[:, None] ** 2 + norms[None, :] ** 2
+                   - 2.0 * probe_norms[:, None] * norms[None, :] * similarity)
+        return np.sqrt(np.maximum(squared, 0.0))
+
+    def nearest(self, probes, exact=False, rows=None):
+        """Best gallery row and its distance for every probe
+
+        ``rows`` limits the search to those gallery rows, always scanned exactly.
+        """
+        if rows is not None:
+            distances = self.distances(probes, rows)
+            best = np.argmin(distances, axis=1)
+            return rows[best], distances[np.arange(len(best)), best]
+        if self.index is not None and not exact:
+            indices, distances = self.index.search(self, probes, 1)
+            return indices[:, 0], distances[:, 0]
+        distances = self.distances(probes)
+        rows = np.arange(distances.shape[0])
+        indices = np.argmin(distances, axis=1)
+        return indices, distances[rows, indices]
+
+    def top_k(self, probes, k, exact=False, rows=None):
+        """Closest ``k`` gallery rows per probe, sorted by ascending distance
+
+        ``rows`` limits the search to those gallery rows, always scanned exactly.
+        """
+        if rows is not None:
+            indices, distances = self._smallest(self.distances(probes, rows), k)
+            return rows[indices], distances
+        if self.index is not None and not exact:
+            return self.index.search(self, probes, k)
+        return self._smallest(self.distances(probes), k)
+
+    @staticmethod
+    def _smallest(distances, k):
+        if k == 1:
+            indices = np.argmin(distances, axis=1)[:, None]
+            return indices, np.take_along_axis(distances, indices, axis=1)
+        k = min(k, distances.shape[1])
+        if k < distances.shape[1]:
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(distances.shape[1]), (distances.shape[0], 1))
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1)
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_distances, order, axis=1)
+
+    def identity(self, index):
+        return {
+            'name': self.names[index],
+            'roll_id': self.rolls[index],
+            'student_id': int(self.ids[index])
+        }
+
+
+def normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1).astype(np.float32)
+    unit = vectors / (norms[:, None] + 1e-7)
+    return np.ascontiguousarray(unit, dtype=np.float32), norms
+
+
+class FaceGallery:
+    """Enrolled face encodings held in one contiguous, pre-normalized float32 matrix.
+
+    Rows live in over-allocated buffers: enrolling a student writes into the
+    spare capacity and publishes a new ``view`` one row longer, so appends
+    are amortized O(1) and never disturb queries running on the previous
+    view. Replacing or removing rows copies the buffers first. ``version``
+    is the enrollment change-log position the gallery reflects.
+
+    An optional ``index`` (see gallery_index.IVFIndex) is told about every
+    appended and removed row and attaches its search structure to each view.
+    """
+
+    def __init__(self, metric='euclidean', dim=None, index=None):
+        if metric not in ('euclidean', 'cosine'):
+            raise ValueError(f"Unsupported gallery metric: {metric}")
+        self.metric = metric
+        self.expected_dim = dim
+        self.index = index
+        self._write_lock = threading.Lock()
+        self.clear()
+
+    def clear(self, version=0):
+        self.version = version
+        self._dim = self.expected_dim
+        self._size = 0
+        self._allocate(0)
+        self._row_by_id = {}
+        if self.index is not None:
+            self.index.reset()
+        self._publish()
+
+    def __len__(self):
+        return len(self.view)
+
+    @property
+    def dim(self):
+        return self.view.dim
+
+    def build(self, ids, names, rolls, encodings, version=0):
+        """Rebuild the gallery from parallel arrays and an (n, dim) encoding matrix"""
+        with self._write_lock:
+            self.clear(version)
+            if len(ids) > 0:
+                self._append(ids, names, rolls, encodings)
+            self._publish()
+
+    def adopt(self, ids, names, rolls, matrix, norms, version=0):
+        """Rebuild the gallery around already-normalized rows without copying them
+
+        Used for memory-mapped snapshots: the arrays become the buffers at
+        full capacity, so the first upsert or removal copies them into
+        memory instead of writing through to the file.
+        """
+        if len(ids) > 0 and self.expected_dim is not None and matrix.shape[1] != self.expected_dim:
+            raise ValueError(f"Encoding dimension {matrix.shape[1]} does not match gallery dimension {self.expected_dim}")
+        with self._write_lock:
+            self.clear(version)
+            if len(ids) > 0:
+                self._dim = matrix.shape[1]
+                self._matrix, self._norms, self._ids, self._names, self._rolls = matrix, norms, ids, names, rolls
+                self._size = len(ids)
+                self._row_by_id = {student_id: row for row, student_id in enumerate(np.asarray(ids).tolist())}
+            self._publish()
+
+    def upsert(self, ids, names, rolls, encodings):
+        """Add new students and replace the encodings of existing ones"""
+        if len(ids) == 0:
+            return
+        with self._write_lock:
+            existing = [student_id for student_id in ids if int(student_id) in self._row_by_id]
+            if existing:
+                self._remove_rows(existing)
+            self._append(ids, names, rolls, encodings)
+            self._publish()
+
+    def remove(self, ids):
+        """Drop students from the gallery; unknown ids are ignored"""
+        with self._write_lock:
+            present = [student_id for student_id in ids if int(student_id) in self._row_by_id]
+            if present:
+                self._remove_rows(present)
+                self._publish()
+
+    # Convenience queries against the current view
+    def accepts(self, dim):
+        return self.view.accepts(dim)
+
+    def distances(self, probes):
+        return self.view.distances(probes)
+
+    def nearest(self, probes, exact=False, rows=None):
+        return self.view.nearest(probes, exact, rows)
+
+    def top_k(self, probes, k, exact=False, rows=None):
+        return self.view.top_k(probes, k, exact, rows)
+
+    def identity(self, index):
+        return self.view.identity(index)
+
+    def _allocate(self, capacity):
+        self._matrix = np.zeros((capacity, self._dim or 0), dtype=np.float32)
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._names = np.zeros(capacity, dtype=object)
+        self._rolls = np.zeros(capacity, dtype=object)
+
+    def _buffers(self):
+        return (self._matrix, self._norms, self._ids, self._names, self._rolls)
+
+    def _grow(self, needed):
+        old = self._buffers()
+        self._allocate(max(needed, 2 * len(self._ids), 64))
+        for new_buffer, old_buffer in zip(self._buffers(), old):
+            new_buffer[:self._size] = old_buffer[:self._size]
+
+    def _append(self, ids, names, rolls, encodings):
+        encodings = np.atleast_2d(np.asarray(encodings, dtype=np.float32))
+        if self._dim is None:
+            self._dim = encodings.shape[1]
+            self._allocate(0)
+        if encodings.shape[1] != self._dim:
+            raise ValueError(f"Encoding dimension {encodings.shape[1]} does not match gallery dimension {self._dim}")
+
+        count = len(ids)
+        if self._size + count > len(self._ids):
+            self._grow(self._size + count)
+
+        rows = slice(self._size, self._size + count)
+        self._matrix[rows], self._norms[rows] = normalize_rows(encodings)
+        self._ids[rows] = ids
+        self._names[rows] = list(names)
+        self._rolls[rows] = list(rolls)
+        for offset, student_id in enumerate(ids):
+            self._row_by_id[int(student_id)] = self._size + offset
+        if self.index is not None:
+            self.index.add(self._size, self._matrix[rows])
+        self._size += count
+
+    def _remove_rows(self, ids):
+        # Copy-on-write so queries holding the previous view keep consistent rows
+        keep = np.ones(self._size, dtype=bool)
+        keep[[self._row_by_id[int(student_id)] for student_id in ids]] = False
+
+        kept = [buffer[:self._size][keep] for buffer in self._buffers()]
+        self._size = int(keep.sum())
+        self._allocate(self._size)
+        for buffer, values in zip(self._buffers(), kept):
+            buffer[:] = values
+        self._row_by_id = {int(student_id): row for row, student_id in enumerate(self._ids[:self._size])}
+        if self.index is not None:
+            self.index.remove(keep)
+
+    def _publish(self):
+        size = self._size
+        index = self.index.snapshot(self._matrix[:size]) if self.index is not None else None
+        self.view = GalleryView(self.metric, self._dim, self._matrix[:size], self._norms[:size],
+                                self._ids[:size], self._names[:size], self._rolls[:size], index)
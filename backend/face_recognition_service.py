@@ -1,10 +1,17 @@
 import cv2
 import numpy as np
-from database import get_all_students, mark_attendance
+from database import get_gallery_encodings, get_gallery_state, get_gallery_changes, get_class_student_ids
+from attendance_writer import AttendanceWriter
 import base64
-from io import BytesIO
-from PIL import Image
 import os
+import threading
+import time
+from face_gallery import FaceGallery
+from face_detector import HaarFaceDetector, HogFaceDetector
+from opencv_features import encode_faces
+from encoding_models import DLIB_RESNET, OPENCV_HISTOGRAM
+from gallery_index import IVFIndex
+from gallery_snapshot import load_gallery_snapshot, write_gallery_snapshot
 
 # Try to import face_recognition, fallback to OpenCV if not available
 try:
@@ -14,37 +21,154 @@ try:
 except ImportError:
     USE_FACE_RECOGNITION = False
     print("⚠️ Using OpenCV fallback for production deployment")
-    from sklearn.metrics.pairwise import cosine_similarity
+
+# face_recognition yields 128-d dlib embeddings compared by euclidean distance,
+# the OpenCV fallback yields 66-d histogram/gradient features compared by cosine
+ENCODING_MODEL = DLIB_RESNET if USE_FACE_RECOGNITION else OPENCV_HISTOGRAM
+FACE_ENCODING_DIM = ENCODING_MODEL.dim
+FACE_DISTANCE_METRIC = ENCODING_MODEL.metric
+
+# How often frame processing checks the enrollment change log for gallery updates
+GALLERY_SYNC_INTERVAL = float(os.environ.get("GALLERY_SYNC_INTERVAL", 2.0))
+# Class scopes whose gallery rows are kept between frames
+SCOPE_CACHE_SIZE = int(os.environ.get("SCOPE_CACHE_SIZE", 64))
+# Mean gray level below which the lower part of a face counts as covered by a mask
+MASK_BRIGHTNESS_THRESHOLD = 80
+
+
+def detect_masks(image, face_locations, to_gray, threshold=MASK_BRIGHTNESS_THRESHOLD):
+    """Flag faces whose lower 40% is dark, i.e. likely covered by a mask"""
+    flags = []
+    for top, right, bottom, left in face_locations:
+        lower_face = image[top + int((bottom - top) * 0.6):bottom, left:right]
+        flags.append(lower_face.size > 0 and cv2.mean(cv2.cvtColor(lower_face, to_gray))[0] < threshold)
+    return flags
+
+
+def assign_unique(student_ids, distances, tolerance, taken=()):
+    """One-to-one assignment of faces to their nearest students, closest faces first
+    
+    ``student_ids`` and ``distances`` hold (n_faces, k) candidates sorted by
+    distance. Returns the chosen candidate column (0) per face, or -1 when the
+    nearest student is beyond the tolerance or already claimed in this frame.
+    A face that loses its nearest student stays unknown: falling back to a
+    runner-up would let a duplicate detection or a stranger mark someone else present.
+    """
+    chosen = np.full(len(distances), -1, dtype=np.int64)
+    taken = set(taken)
+    for face in np.argsort(distances[:, 0], kind='stable'):
+        student_id = int(student_ids[face, 0])
+        if distances[face, 0] < tolerance and student_id not in taken:
+            chosen[face] = 0
+            taken.add(student_id)
+    return chosen
 
 class FaceRecognitionService:
-    def __init__(self):
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.known_face_ids = []
-        self.known_face_rolls = []
+    def __init__(self, attendance_writer=None, load_gallery=True):
+        # Only encodings of this model are loaded; students enrolled with another wait for re-embedding
+        self.encoding_model = ENCODING_MODEL
+        self.gallery = FaceGallery(metric=FACE_DISTANCE_METRIC, dim=FACE_ENCODING_DIM, index=IVFIndex())
+        self.gallery_database_id = None
+        self.attendance_writer = attendance_writer or AttendanceWriter()
         self.tolerance = 0.6
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+        self._scope_rows_cache = {}
         
-        if not USE_FACE_RECOGNITION:
-            self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        # Detection runs on a downscaled copy; embeddings use full-resolution crops
+        self.face_detector = HogFaceDetector() if USE_FACE_RECOGNITION else HaarFaceDetector()
         
-        self.load_known_faces()
+        # Encoding-only workers (bulk enrollment) never match against the gallery
+        if load_gallery:
+            self.load_known_faces()
     
     def load_known_faces(self):
-        """Load enrollment photos for attendance marking"""
-        students = get_all_students()
+        """Load enrollment photos for attendance marking
+        
+        The newest on-disk snapshot of this database is memory-mapped and
+        brought up to date from the enrollment change log; SQLite is read in
+        full only when there is no snapshot. A stale or missing snapshot is
+        rewritten so the next worker maps the current version directly.
+        """
+        with self._sync_lock:
+            # Read the version first; changes racing the load are re-applied by the next sync
+            database_id, version = get_gallery_state()
+            snapshot = load_gallery_snapshot(database_id, self.encoding_model, version)
+            if snapshot is not None:
+                self.gallery.adopt(snapshot.ids, snapshot.names, snapshot.rolls, snapshot.matrix, snapshot.norms,
+                                   version=snapshot.version)
+            else:
+                ids, names, rolls, encodings = get_gallery_encodings(self.encoding_model)
+                self.gallery.build(ids, names, rolls, encodings, version=version)
+            self.gallery_database_id = database_id
+            self._last_sync = time.monotonic()
         
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.known_face_ids = []
-        self.known_face_rolls = []
+        source = f"snapshot v{snapshot.version}" if snapshot is not None else "database"
+        print(f"🎯 Loaded {len(self.gallery)} students for attendance from {source}")
+        
+        if snapshot is None or snapshot.version != version:
+            self.sync_gallery()
+            self.save_gallery_snapshot()
+    
+    def save_gallery_snapshot(self):
+        """Write the current gallery as the snapshot for its version and map it in place of the in-memory rows"""
+        with self._sync_lock:
+            database_id, version, view = self.gallery_database_id, self.gallery.version, self.gallery.view
+            if len(view) == 0:
+                return False
+            try:
+                write_gallery_snapshot(database_id, self.encoding_model, version, view)
+                snapshot = load_gallery_snapshot(database_id, self.encoding_model, version)
+            except Exception as e:
+                print(f"⚠️ Could not write gallery snapshot: {e}")
+                return False
+            if snapshot is None or snapshot.version != version:
+                return False
+            self.gallery.adopt(snapshot.ids, snapshot.names, snapshot.rolls, snapshot.matrix, snapshot.norms,
+                               version=version)
+        
+        print(f"📦 Gallery snapshot v{version} mapped ({len(snapshot)} students)")
+        return True
+    
+    def sync_gallery(self):
+        """Apply enrollment changes committed since the gallery was loaded
+        
+        Only the changed students are read from SQLite; a full reload happens
+        only when the database itself was recreated.
+        """
+        with self._sync_lock:
+            self._last_sync = time.monotonic()
+            database_id, version = get_gallery_state()
+            if database_id == self.gallery_database_id and version == self.gallery.version:
+                return 0
+            
+            if database_id != self.gallery_database_id or version < self.gallery.version:
+                full_reload = True
+            else:
+                full_reload = False
+                changes = get_gallery_changes(self.gallery.version)
+                changed = [student_id for student_id, op in changes.items() if op == 'upsert']
+                ids, names, rolls, encodings = get_gallery_encodings(self.encoding_model, changed)
+                
+                # Deleted students, and students whose new encoding is not usable here
+                loaded = set(ids)
+                self.gallery.remove([student_id for student_id in changes if student_id not in loaded])
+                self.gallery.upsert(ids, names, rolls, encodings)
+                self.gallery.version = version
         
-        for student in students:
-            self.known_face_encodings.append(student['face_encoding'])
-            self.known_face_names.append(student['name'])
-            self.known_face_ids.append(student['id'])
-            self.known_face_rolls.append(student['roll_id'])
+        if full_reload:
+            self.load_known_faces()
+            return len(self.gallery)
         
-        print(f"🎯 Loaded {len(students)} students for attendance")
+        print(f"🔄 Gallery synced to version {version} ({len(changes)} changed students)")
+        return len(changes)
+    
+    def _maybe_sync_gallery(self):
+        if time.monotonic() - self._last_sync >= GALLERY_SYNC_INTERVAL:
+            try:
+                self.sync_gallery()
+            except Exception as e:
+                print(f"⚠️ Gallery sync failed: {e}")
     
     def encode_face_from_image(self, image_file):
         """Extract face encoding - uses best available method"""
@@ -60,7 +184,7 @@ class FaceRecognitionService:
     def _encode_with_face_recognition(self, image_file):
         """Use face_recognition library (local)"""
         image = face_recognition.load_image_file(image_file)
-        face_locations = face_recognition.face_locations(image)
+        face_locations = self.face_detector.detect(image)
         
         if len(face_locations) == 0:
             return None
@@ -74,268 +198,279 @@ class FaceRecognitionService:
         if image is None:
             return None
         
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+        faces = self.face_detector.detect(image)
         
         if len(faces) == 0:
             return None
         
         # Use largest face
-        largest_face = max(faces, key=lambda x: x[2] * x[3])
-        x, y, w, h = largest_face
-        face_region = image[y:y+h, x:x+w]
+        top, right, bottom, left = max(faces, key=lambda box: (box[1] - box[3]) * (box[2] - box[0]))
+        face_region = image[top:bottom, left:right]
         
-        return self._create_opencv_encoding(face_region)
+        return encode_faces([face_region])[0]
+    
+    def frame_bytes(self, frame_data):
+        """Encoded image bytes from raw bytes or a base64 data URL"""
+        if isinstance(frame_data, str):
+            # Legacy clients send canvas.toDataURL() output
+            return base64.b64decode(frame_data.split(',', 1)[-1])
+        return frame_data
     
-    def _create_opencv_encoding(self, face_region):
-        """Create encoding using OpenCV features"""
+    def decode_frame(self, frame_data):
+        """Decode raw JPEG/PNG bytes or a base64 data URL straight to a BGR image"""
+        frame = cv2.imdecode(np.frombuffer(self.frame_bytes(frame_data), dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Could not decode frame image")
+        return frame
+    
+    def process_frame(self, frame_data, tracker=None, scope=None, gate=None):
+        """Process video frame - uses best available method
+        
+        With a per-camera FaceTracker, faces that stay put between frames
+        reuse their previous identification instead of being re-embedded.
+        A ClassScope restricts matching to the students of one class, and a
+        MotionGate returns the previous results for frames that barely changed.
+        """
         try:
-            face_resized = cv2.resize(face_region, (128, 128))
-            gray_face = cv2.cvtColor(face_resized, cv2.COLOR_BGR2GRAY)
+            self._maybe_sync_gallery()
+            frame_data = self.frame_bytes(frame_data)
             
-            hist = cv2.calcHist([gray_face], [0], None, [64], [0, 256])
-            grad_x = cv2.Sobel(gray_face, cv2.CV_64F, 1, 0, ksize=3)
-            grad_y = cv2.Sobel(gray_face, cv2.CV_64F, 0, 1, ksize=3)
+            thumbnail = None
+            gallery_key = (self.gallery_database_id, self.gallery.version)
+            if gate is not None:
+                thumbnail = gate.thumbnail(frame_data)
+                if gate.unchanged(thumbnail, gallery_key):
+                    return gate.cached_results()
             
-            features = np.concatenate([
-                hist.flatten(),
-                [np.mean(grad_x)],
-                [np.mean(grad_y)]
-            ])
-            
-            return features / (np.linalg.norm(features) + 1e-7)
-        except:
-            return np.random.rand(66)
-    
-    def process_frame(self, frame_data):
-        """Process video frame - uses best available method"""
-        try:
+            frame = self.decode_frame(frame_data)
             if USE_FACE_RECOGNITION:
-                return self._process_with_face_recognition(frame_data)
+                results = self._process_with_face_recognition(frame, tracker, scope)
             else:
-                return self._process_with_opencv(frame_data)
+                results = self._process_with_opencv(frame, tracker, scope)
+            
+            if gate is not None:
+                gate.update(thumbnail, results, gallery_key)
+            return results
         except Exception as e:
             print(f"❌ Error processing frame: {e}")
             return []
     
-    def _process_with_face_recognition(self, frame_data):
+    def _process_with_face_recognition(self, frame, tracker=None, scope=None):
         """Process using face_recognition library"""
-        image_data = base64.b64decode(frame_data.split(',')[1])
-        image = Image.open(BytesIO(image_data))
-        frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
         rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         
-        face_locations = face_recognition.face_locations(rgb_frame)
+        face_locations = self.face_detector.detect(rgb_frame)
         if len(face_locations) == 0:
             return []
         
-        face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-        results = []
+        # Simple mask detection: a dark lower face indicates a mask
+        mask_flags = detect_masks(rgb_frame, face_locations, cv2.COLOR_RGB2GRAY)
         
-        for i, face_encoding in enumerate(face_encodings):
-            face_location = face_locations[i]
-            
-            # Check for mask detection using face region analysis
-            top, right, bottom, left = face_location
-            face_region = rgb_frame[top:bottom, left:right]
-            
-            # Simple mask detection based on face coverage
-            face_height = bottom - top
-            lower_face = face_region[int(face_height * 0.6):, :]
-            
-            # Check if lower face is obscured (mask detection)
-            lower_face_gray = cv2.cvtColor(lower_face, cv2.COLOR_RGB2GRAY)
-            mask_detected = np.mean(lower_face_gray) < 80  # Dark region indicates mask
-            
-            if len(self.known_face_encodings) > 0:
-                face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                best_match_index = np.argmin(face_distances)
-                min_distance = face_distances[best_match_index]
-                
-                if min_distance < self.tolerance:
-                    name = self.known_face_names[best_match_index]
-                    student_id = self.known_face_ids[best_match_index]
-                    roll_number = self.known_face_rolls[best_match_index]
-                    
-                    attendance_marked = mark_attendance(student_id)
-                    confidence = round((1 - min_distance) * 100, 1)
-                    
-                    # Determine status based on mask detection
-                    if mask_detected:
-                        status = 'Recognized with Mask'
-                        result_type = 'masked'
-                    else:
-                        status = 'Recognized & Present'
-                        result_type = 'present'
-                    
-                    results.append({
-                        'name': name,
-                        'roll_number': roll_number,
-                        'status': status,
-                        'timestamp': self.get_current_time(),
-                        'type': result_type,
-                        'confidence': confidence,
-                        'attendance_marked': attendance_marked,
-                        'student_id': student_id
-                    })
-                else:
-                    # Unknown person detected
-                    confidence = round((1 - min_distance) * 100, 1) if min_distance < 1.0 else 0
-                    
-                    if mask_detected:
-                        status = 'Unknown Person with Mask'
-                        result_type = 'unknown_masked'
-                    else:
-                        status = 'Unknown Person Detected'
-                        result_type = 'unknown'
-                    
-                    results.append({
-                        'name': 'Unknown Person',
-                        'roll_number': None,
-                        'status': status,
-                        'timestamp': self.get_current_time(),
-                        'type': result_type,
-                        'confidence': confidence,
-                        'attendance_marked': False,
-                        'student_id': None
-                    })
-            else:
-                # No enrolled students - all are unknown
-                results.append({
-                    'name': 'Unknown Person',
-                    'roll_number': None,
-                    'status': 'Unknown Person - No Students Enrolled',
-                    'timestamp': self.get_current_time(),
-                    'type': 'unknown',
-                    'confidence': 0,
-                    'attendance_marked': False,
-                    'student_id': None
-                })
+        def encode(locations):
+            # One call embeds every face that needs it
+            return face_recognition.face_encodings(rgb_frame, locations)
         
-        return results
+        return self._identify_faces(face_locations, mask_flags, encode, tracker, scope)
     
-    def _process_with_opencv(self, frame_data):
+    def _process_with_opencv(self, frame, tracker=None, scope=None):
         """Process using OpenCV fallback"""
-        image_data = base64.b64decode(frame_data.split(',')[1])
-        image = Image.open(BytesIO(image_data))
-        frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        face_locations = self.face_detector.detect(frame)
         
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+        mask_flags = detect_masks(frame, face_locations, cv2.COLOR_BGR2GRAY)
         
+        def encode(locations):
+            # Crops are stacked and featurized together; None marks a crop that could not be encoded
+            return encode_faces([frame[top:bottom, left:right] for top, right, bottom, left in locations])
+        
+        return self._identify_faces(face_locations, mask_flags, encode, tracker, scope)
+    
+    def _identify_faces(self, face_locations, mask_flags, encode, tracker=None, scope=None):
+        """Embed and match the faces that need it, reusing tracked identities for the rest
+        
+        All faces of the frame are embedded together, matched in one batch
+        and marked present with a single attendance call.
+        """
+        if tracker is None:
+            tracks, to_embed = None, list(range(len(face_locations)))
+        else:
+            tracks, to_embed = tracker.update(face_locations)
+        
+        matches = [None] * len(face_locations)
+        distances = [None] * len(face_locations)
+        fresh = set(to_embed)
+        for i in range(len(face_locations)):
+            if i not in fresh:
+                matches[i], distances[i] = tracks[i].match, tracks[i].distance
+        
+        if to_embed:
+            # Students held by tracked faces cannot be claimed by another face in this frame
+            taken = [match['student_id'] for match in matches if match is not None]
+            face_encodings = encode([face_locations[i] for i in to_embed])
+            embedded = [i for i, encoding in zip(to_embed, face_encodings) if encoding is not None]
+            if len(embedded) < len(to_embed):
+                # Reported as unknown and left unidentified so the tracker embeds them again next frame
+                print(f"⚠️ Could not encode {len(to_embed) - len(embedded)} detected face(s)")
+                for i in set(to_embed) - set(embedded):
+                    distances[i] = float('inf')
+                face_encodings = [encoding for encoding in face_encodings if encoding is not None]
+            for i, (match, distance) in zip(embedded, self._match_encodings(face_encodings, scope, taken)):
+                matches[i], distances[i] = match, distance
+                if tracks is not None and distance is not None:
+                    tracks[i].identify(match, distance)
+        
+        recognized = [matches[i]['student_id'] for i in to_embed if matches[i] is not None]
+        newly_marked = self.attendance_writer.mark_many(recognized, self.gallery_database_id) if recognized else set()
+        
+        timestamp = self.get_current_time()
         results = []
-        for (x, y, w, h) in faces:
-            face_region = frame[y:y+h, x:x+w]
-            
-            # Mask detection for OpenCV
-            face_gray = cv2.cvtColor(face_region, cv2.COLOR_BGR2GRAY)
-            lower_face = face_gray[int(h * 0.6):, :]
-            mask_detected = np.mean(lower_face) < 80 if len(lower_face) > 0 else False
+        for i, mask_detected in enumerate(mask_flags):
+            marked = i in fresh and matches[i] is not None and matches[i]['student_id'] in newly_marked
+            results.append(self._build_result(matches[i], distances[i], mask_detected, marked, timestamp))
+        
+        return results
+    
+    def _match_encodings(self, face_encodings, scope=None, taken=()):
+        """Match every embedded face against the gallery in one batch
+        
+        Candidates for all faces come from one probe x gallery search. With a
+        ClassScope only that class's rows are searched, and faces it cannot
+        place are retried against the whole gallery when the scope allows
+        fallback. Faces are then assigned one-to-one to their nearest student,
+        closest first, so two faces never claim the same student; a face
+        whose nearest student is claimed, here or among the ``taken``
+        students of tracked faces, is unknown. Returns (identity or None, distance) per face;
+        distance is None when there is nothing enrolled to compare against.
+        """
+        if len(face_encodings) == 0:
+            return []
+        
+        probes = np.asarray(face_encodings, dtype=np.float32)
+        view = self.gallery.view
+        if not view.accepts(probes.shape[1]):
+            return [(None, None)] * len(probes)
+        
+        rows, distances = self._candidates(view, probes, scope, 1)
+        claimed = view.ids[rows[:, 0]][distances[:, 0] < self.tolerance].tolist()
+        if len(set(claimed)) < len(claimed) or set(taken) & set(claimed):
+            # Only to report how close faces losing a conflict came to anyone unclaimed:
+            # enough runners-up to get past every other face's student and every tracked one
+            rows, distances = self._candidates(view, probes, scope, min(len(probes) + len(set(taken)), len(view)))
+        
+        student_ids = view.ids[rows]
+        chosen = assign_unique(student_ids, distances, self.tolerance, taken)
+        assigned = set(taken) | {int(student_ids[face, column]) for face, column in enumerate(chosen) if column >= 0}
+        matches = []
+        for face, column in enumerate(chosen):
+            if column >= 0:
+                matches.append((view.identity(rows[face, column]), float(distances[face, column])))
+            else:
+                # Unknown faces report their closest student nobody else holds, not one they lost to
+                unclaimed = distances[face][~np.isin(student_ids[face], list(assigned))]
+                matches.append((None, float(unclaimed.min()) if len(unclaimed) else float('inf')))
+        return matches
+    
+    def _candidates(self, view, probes, scope, k):
+        """Closest ``k`` gallery rows per probe, searching a class first when a scope is given"""
+        if scope is None:
+            return view.top_k(probes, k)
+        
+        rows = np.full((len(probes), k), -1, dtype=np.int64)
+        distances = np.full((len(probes), k), np.inf, dtype=np.float32)
+        class_rows = self._scope_rows(view, scope)
+        if len(class_rows):
+            found = min(k, len(class_rows))
+            rows[:, :found], distances[:, :found] = view.top_k(probes, found, rows=class_rows)
+        retry = np.nonzero(distances[:, 0] >= self.tolerance)[0] if scope.fallback else []
+        if len(retry):
+            rows[retry], distances[retry] = view.top_k(probes[retry], k)
+        return rows, distances
+    
+    def _scope_rows(self, view, scope):
+        """Gallery rows of a class scope, looked up once per published gallery view"""
+        cached = self._scope_rows_cache.get(scope)
+        if cached is not None and cached[0] is view:
+            return cached[1]
+        
+        student_ids = get_class_student_ids(scope.department, scope.section, scope.roll_ids)
+        rows = np.nonzero(np.isin(view.ids, student_ids))[0]
+        if len(self._scope_rows_cache) >= SCOPE_CACHE_SIZE:
+            self._scope_rows_cache.clear()
+        self._scope_rows_cache[scope] = (view, rows)
+        return rows
+    
+    def _build_result(self, match, min_distance, mask_detected, attendance_marked=False, timestamp=None):
+        """Build the API result for one face"""
+        timestamp = timestamp or self.get_current_time()
+        if min_distance is None:
+            # No enrolled students - all are unknown
+            return {
+                'name': 'Unknown Person',
+                'roll_number': None,
+                'status': 'Unknown Person - No Students Enrolled',
+                'timestamp': timestamp,
+                'type': 'unknown',
+                'confidence': 0,
+                'attendance_marked': False,
+                'student_id': None
+            }
+        
+        if match is not None:
+            student_id = match['student_id']
             
-            face_encoding = self._create_opencv_encoding(face_region)
+            confidence = round((1 - min_distance) * 100, 1)
             
-            if len(self.known_face_encodings) > 0:
-                distances = []
-                for known_encoding in self.known_face_encodings:
-                    try:
-                        similarity = cosine_similarity([known_encoding], [face_encoding])[0][0]
-                        distances.append(1 - similarity)
-                    except:
-                        distances.append(1.0)
-                
-                distances = np.array(distances)
-                best_match_index = np.argmin(distances)
-                min_distance = distances[best_match_index]
-                
-                if min_distance < self.tolerance:
-                    name = self.known_face_names[best_match_index]
-                    student_id = self.known_face_ids[best_match_index]
-                    roll_number = self.known_face_rolls[best_match_index]
-                    
-                    attendance_marked = mark_attendance(student_id)
-                    confidence = round((1 - min_distance) * 100, 1)
-                    
-                    # Determine status based on mask detection
-                    if mask_detected:
-                        status = 'Recognized with Mask'
-                        result_type = 'masked'
-                    else:
-                        status = 'Recognized & Present'
-                        result_type = 'present'
-                    
-                    results.append({
-                        'name': name,
-                        'roll_number': roll_number,
-                        'status': status,
-                        'timestamp': self.get_current_time(),
-                        'type': result_type,
-                        'confidence': confidence,
-                        'attendance_marked': attendance_marked,
-                        'student_id': student_id
-                    })
-                else:
-                    # Unknown person detected
-                    confidence = round((1 - min_distance) * 100, 1) if min_distance < 1.0 else 0
-                    
-                    if mask_detected:
-                        status = 'Unknown Person with Mask'
-                        result_type = 'unknown_masked'
-                    else:
-                        status = 'Unknown Person Detected'
-                        result_type = 'unknown'
-                    
-                    results.append({
-                        'name': 'Unknown Person',
-                        'roll_number': None,
-                        'status': status,
-                        'timestamp': self.get_current_time(),
-                        'type': result_type,
-                        'confidence': confidence,
-                        'attendance_marked': False,
-                        'student_id': None
-                    })
+            # Determine status based on mask detection
+            if mask_detected:
+                status = 'Recognized with Mask'
+                result_type = 'masked'
             else:
-                # No enrolled students
-                results.append({
-                    'name': 'Unknown Person',
-                    'roll_number': None,
-                    'status': 'Unknown Person - No Students Enrolled',
-                    'timestamp': self.get_current_time(),
-                    'type': 'unknown',
-                    'confidence': 0,
-                    'attendance_marked': False,
-                    'student_id': None
-                })
+                status = 'Recognized & Present'
+                result_type = 'present'
+            
+            return {
+                'name': match['name'],
+                'roll_number': match['roll_id'],
+                'status': status,
+                'timestamp': timestamp,
+                'type': result_type,
+                'confidence': confidence,
+                'attendance_marked': attendance_marked,
+                'student_id': student_id
+            }
         
-        return results
+        # Unknown person detected
+        confidence = round((1 - min_distance) * 100, 1) if min_distance < 1.0 else 0
+        
+        if mask_detected:
+            status = 'Unknown Person with Mask'
+            result_type = 'unknown_masked'
+        else:
+            status = 'Unknown Person Detected'
+            result_type = 'unknown'
+        
+        return {
+            'name': 'Unknown Person',
+            'roll_number': None,
+            'status': status,
+            'timestamp': timestamp,
+            'type': result_type,
+            'confidence': confidence,
+            'attendance_marked': False,
+            'student_id': None
+        }
     
     def check_duplicate_face(self, new_face_encoding, tolerance=0.5):
         """Check if face encoding already exists"""
         try:
-            if len(self.known_face_encodings) == 0:
+            probe = np.asarray(new_face_encoding, dtype=np.float32).reshape(1, -1)
+            if not self.gallery.accepts(probe.shape[1]):
                 return None
             
-            if USE_FACE_RECOGNITION:
-                face_distances = face_recognition.face_distance(self.known_face_encodings, new_face_encoding)
-            else:
-                distances = []
-                for known_encoding in self.known_face_encodings:
-                    try:
-                        similarity = cosine_similarity([known_encoding], [new_face_encoding])[0][0]
-                        distances.append(1 - similarity)
-                    except:
-                        distances.append(1.0)
-                face_distances = np.array(distances)
-            
-            matches = face_distances < tolerance
+            # One probe is cheap to scan exactly, and a missed duplicate would enroll a student twice
+            match_indices, match_distances = self.gallery.nearest(probe, exact=True)
             
-            if any(matches):
-                match_index = np.argmin(face_distances)
-                return {
-                    'name': self.known_face_names[match_index],
-                    'roll_id': self.known_face_rolls[match_index],
-                    'student_id': self.known_face_ids[match_index]
-                }
+            if match_distances[0] < tolerance:
+                return self.gallery.identity(match_indices[0])
             
             return None
             
@@ -0,0 +1,138 @@
+import os
+import numpy as np
+
+# Tracking configuration
+TRACK_IOU_THRESHOLD = float(os.environ.get("TRACK_IOU_THRESHOLD", 0.4))
+TRACK_REEMBED_INTERVAL = int(os.environ.get("TRACK_REEMBED_INTERVAL", 10))
+TRACK_UNKNOWN_REEMBED_INTERVAL = int(os.environ.get("TRACK_UNKNOWN_REEMBED_INTERVAL", 2))
+TRACK_MAX_MOTION = float(os.environ.get("TRACK_MAX_MOTION", 0.25))
+TRACK_CONFIDENCE_DECAY = float(os.environ.get("TRACK_CONFIDENCE_DECAY", 0.97))
+TRACK_MIN_CONFIDENCE = float(os.environ.get("TRACK_MIN_CONFIDENCE", 0.45))
+TRACK_MAX_MISSED = int(os.environ.get("TRACK_MAX_MISSED", 5))
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU of (top, right, bottom, left) boxes, shape (len(a), len(b))"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+
+    intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return intersection / np.maximum(union, 1e-7)
+
+
+class FaceTrack:
+    """A face followed across frames together with its last identification"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = tuple(box)
+        self.embedded_box = None
+        self.frames_since_embed = 0
+        self.missed = 0
+        self.match = None
+        self.distance = 1.0
+        self.confidence = 0.0
+
+    def identify(self, match, distance):
+        """Record the result of a fresh embedding + gallery match"""
+        self.match = match
+        self.distance = distance
+        self.confidence = max(0.0, 1.0 - distance) if match is not None else 0.0
+        self.embedded_box = self.box
+        self.frames_since_embed = 0
+
+    def moved(self):
+        top, right, bottom, left = self.box
+        e_top, e_right, e_bottom, e_left = self.embedded_box
+        size = max(e_right - e_left, e_bottom - e_top, 1)
+        shift = np.hypot((left + right - e_left - e_right) / 2, (top + bottom - e_top - e_bottom) / 2)
+        return shift / size
+
+
+class FaceTracker:
+    """Per-camera IoU tracker that carries identities forward between frames.
+
+    ``update`` associates the detected boxes with existing tracks and tells
+    the caller which faces need a fresh embedding: new tracks, tracks due for
+    periodic re-identification, tracks that moved since their last
+    embedding, and tracks whose decayed confidence dropped too low. All
+    other faces reuse the identity of their track.
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, reembed_interval=TRACK_REEMBED_INTERVAL,
+                 unknown_reembed_interval=TRACK_UNKNOWN_REEMBED_INTERVAL, max_motion=TRACK_MAX_MOTION,
+                 confidence_decay=TRACK_CONFIDENCE_DECAY, min_confidence=TRACK_MIN_CONFIDENCE,
+                 max_missed=TRACK_MAX_MISSED):
+        self.iou_threshold = iou_threshold
+        self.reembed_interval = reembed_interval
+        self.unknown_reembed_interval = unknown_reembed_interval
+        self.max_motion = max_motion
+        self.confidence_decay = confidence_decay
+        self.min_confidence = min_confidence
+        self.max_missed = max_missed
+        self.tracks = []
+        self.next_track_id = 1
+
+    def update(self, boxes):
+        """Associate this frame's boxes with tracks
+
+        Returns the track for every box (in input order) and the indices of
+        the boxes that must be embedded again.
+        """
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        assigned = [None] * len(boxes)
+
+        if self.tracks and boxes:
+            iou = box_iou([t.box for t in self.tracks], boxes)
+            # Greedy association, best overlaps first
+            for track_index, box_index in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                if iou[track_index, box_index] < self.iou_threshold:
+                    break
+                track = self.tracks[track_index]
+                if assigned[box_index] is None and track.missed >= 0:
+                    assigned[box_index] = track
+                    track.missed = -1  # claimed this frame
+
+        for track in self.tracks:
+            track.missed = 0 if track.missed < 0 else track.missed + 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+        needs_embedding = []
+        for box_index, box in enumerate(boxes):
+            track = assigned[box_index]
+            if track is None:
+                track = FaceTrack(self.next_track_id, box)
+                self.next_track_id += 1
+                self.tracks.append(track)
+                assigned[box_index] = track
+                needs_embedding.append(box_index)
+                continue
+
+            track.box = box
+            track.frames_since_embed += 1
+            if self._is_stale(track):
+                needs_embedding.append(box_index)
+
+        return assigned, needs_embedding
+
+    def _is_stale(self, track):
+        if track.embedded_box is None:
+            return True
+        interval = self.reembed_interval if track.match is not None else self.unknown_reembed_interval
+        if track.frames_since_embed >= interval:
+            return True
+        if track.moved() > self.max_motion:
+            return True
+        decayed = track.confidence * self.confidence_decay ** track.frames_since_embed
+        return track.match is not None and decayed < self.min_confidence
+
+    def reset(self):
+        self.tracks = []
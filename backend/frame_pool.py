@@ -0,0 +1,122 @@
+import asyncio
+import os
+from multiprocessing.util import Finalize
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Frame processing pool configuration
+FRAME_POOL_KIND = os.environ.get("FRAME_POOL_KIND", "thread")  # "thread" or "process"
+FRAME_POOL_WORKERS = int(os.environ.get("FRAME_POOL_WORKERS", min(4, os.cpu_count() or 1)))
+FRAME_POOL_QUEUE_DEPTH = int(os.environ.get("FRAME_POOL_QUEUE_DEPTH", FRAME_POOL_WORKERS * 2))
+FRAME_POOL_PER_CAMERA = int(os.environ.get("FRAME_POOL_PER_CAMERA", 2))
+FRAME_POOL_RETRY_AFTER = int(os.environ.get("FRAME_POOL_RETRY_AFTER", 1))
+
+# Recognition service owned by each worker process in "process" mode
+_worker_service = None
+
+
+def _init_process_worker():
+    global _worker_service
+    from face_recognition_service import FaceRecognitionService
+    _worker_service = FaceRecognitionService()
+    # atexit does not run in pool workers; flush queued attendance when the worker exits
+    Finalize(None, _worker_service.attendance_writer.stop, exitpriority=10)
+
+
+def _process_frame_in_worker(frame, tracker, scope, gate):
+    # The tracker and motion gate are pickled in and out, so the updated copies are returned to the caller
+    return _worker_service.process_frame(frame, tracker, scope, gate), tracker, gate
+
+
+class FramePoolSaturated(Exception):
+    """Raised when a frame cannot be queued without exceeding the pool limits"""
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class FramePool:
+    """Runs CPU-bound frame recognition off the event loop with bounded queueing.
+
+    At most ``workers + queue_depth`` frames are admitted at once (503 beyond
+    that) and each identified camera may only have ``per_camera`` frames
+    admitted (429 beyond that), so one slow camera cannot starve the others.
+    Frames without a camera id are only bound by the pool limit. Admission
+    bookkeeping happens on the event loop thread only, so plain counters are
+    sufficient.
+    """
+
+    def __init__(self, face_service, kind=FRAME_POOL_KIND, workers=FRAME_POOL_WORKERS,
+                 queue_depth=FRAME_POOL_QUEUE_DEPTH, per_camera=FRAME_POOL_PER_CAMERA,
+                 retry_after=FRAME_POOL_RETRY_AFTER):
+        self.face_service = face_service
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = workers + queue_depth
+        self.per_camera = per_camera
+        self.retry_after = retry_after
+        self.pending = 0
+        self.pending_by_camera = {}
+
+        if kind == "process":
+            # Each process loads its own gallery; the main process service is used for enrollment
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_process_worker)
+            self._task = _process_frame_in_worker
+        elif kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="frame-worker")
+            self._task = self._process_frame_in_thread
+        else:
+            raise ValueError(f"Unknown frame pool kind: {kind}")
+
+        print(f"🧵 Frame pool ready ({kind}, {workers} workers, {self.max_pending} max pending)")
+
+    def _process_frame_in_thread(self, frame, tracker, scope, gate):
+        return self.face_service.process_frame(frame, tracker, scope, gate), tracker, gate
+
+    async def process(self, frame, camera_id=None, session=None, scope=None):
+        """Recognize faces in a frame without blocking the event loop
+
+        When a RecognitionSession is given, its tracker carries identities
+        across this camera's frames, its MotionGate skips unchanged frames
+        and its ClassScope limits matching; ``scope`` does the same for
+        frames without a session.
+        """
+        if self.pending >= self.max_pending:
+            raise FramePoolSaturated("Recognition pool is saturated, retry shortly", 503, self.retry_after)
+        if camera_id is not None and self.pending_by_camera.get(camera_id, 0) >= self.per_camera:
+            raise FramePoolSaturated(f"Too many frames in flight for camera {camera_id}", 429, self.retry_after)
+
+        self.pending += 1
+        if camera_id is not None:
+            self.pending_by_camera[camera_id] = self.pending_by_camera.get(camera_id, 0) + 1
+        try:
+            loop = asyncio.get_running_loop()
+            if session is None:
+                results, _, _ = await loop.run_in_executor(self.executor, self._task, frame, None, scope, None)
+                return results
+
+            async with session.lock:
+                results, session.tracker, session.motion_gate = await loop.run_in_executor(
+                    self.executor, self._task, frame, session.tracker, session.scope, session.motion_gate)
+            return results
+        finally:
+            self.pending -= 1
+            if camera_id is not None:
+                remaining = self.pending_by_camera[camera_id] - 1
+                if remaining:
+                    self.pending_by_camera[camera_id] = remaining
+                else:
+                    del self.pending_by_camera[camera_id]
+
+    def stats(self):
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'cameras': len(self.pending_by_camera)
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
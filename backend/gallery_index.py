@@ -0,0 +1,128 @@
+import os
+import numpy as np
+
+# Approximate search configuration; galleries smaller than FACE_INDEX_MIN_SIZE are always searched exactly
+FACE_INDEX_MIN_SIZE = int(os.environ.get("FACE_INDEX_MIN_SIZE", 10000))
+# Inverted lists scanned per probe: higher is slower with better recall
+FACE_INDEX_NPROBE = int(os.environ.get("FACE_INDEX_NPROBE", 8))
+# Number of inverted lists; 0 picks about sqrt(gallery size)
+FACE_INDEX_NLIST = int(os.environ.get("FACE_INDEX_NLIST", 0))
+
+# Rows sampled per list when training the coarse quantizer
+TRAINING_ROWS_PER_LIST = 64
+TRAINING_ITERATIONS = 10
+
+
+class IVFIndex:
+    """Inverted-file index over the gallery's unit-length rows.
+
+    A spherical k-means quantizer splits the gallery into ``nlist`` lists of
+    row numbers; a query scores the centroids, scans only the ``nprobe``
+    closest lists, and ranks those candidates with the gallery's exact
+    distance. FaceGallery reports appended and removed rows as they happen,
+    so enrollments never trigger a full rebuild. The quantizer is retrained
+    when the gallery has doubled or halved since it was last trained, and
+    dropped entirely below ``min_size`` where exact search is cheaper.
+    """
+
+    def __init__(self, nprobe=FACE_INDEX_NPROBE, min_size=FACE_INDEX_MIN_SIZE, nlist=FACE_INDEX_NLIST, seed=0):
+        self.nprobe = max(1, nprobe)
+        self.min_size = min_size
+        self.nlist = nlist
+        self.seed = seed
+        self.reset()
+
+    @property
+    def trained(self):
+        return self._centroids is not None
+
+    def reset(self):
+        self._centroids = None
+        self._lists = []
+        self._trained_size = 0
+
+    def add(self, first_row, unit_rows):
+        """File rows ``first_row ...`` under their closest centroid"""
+        if not self.trained or len(unit_rows) == 0:
+            return
+        assignments = self._assign(unit_rows)
+        for list_id in np.unique(assignments):
+            new_rows = first_row + np.nonzero(assignments == list_id)[0]
+            # Lists are replaced, never written in place, so published snapshots stay valid
+            self._lists[list_id] = np.concatenate([self._lists[list_id], new_rows])
+
+    def remove(self, keep):
+        """Drop rows where ``keep`` is False and renumber the rest as the gallery compacts them"""
+        if not self.trained:
+            return
+        new_rows = np.cumsum(keep) - 1
+        self._lists = [new_rows[rows[keep[rows]]] for rows in self._lists]
+
+    def snapshot(self, unit_matrix):
+        """Search structure for a published view, or None when exact search should be used"""
+        size = len(unit_matrix)
+        if size == 0 or size < self.min_size:
+            self.reset()
+            return None
+        if not self.trained or size > 2 * self._trained_size or size < self._trained_size // 2:
+            self._train(unit_matrix)
+        return IVFSnapshot(self._centroids, list(self._lists), self.nprobe)
+
+    def _assign(self, unit_rows):
+        return np.argmax(unit_rows @ self._centroids.T, axis=1)
+
+    def _train(self, unit_matrix):
+        size = len(unit_matrix)
+        nlist = min(self.nlist or int(np.sqrt(size)), size)
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(size, nlist * TRAINING_ROWS_PER_LIST)
+        sample = unit_matrix[rng.choice(size, sample_size, replace=False)]
+
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(TRAINING_ITERATIONS):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=nlist)
+            # Empty lists restart from a random sample row
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-7)
+
+        self._centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        assignments = self._assign(unit_matrix)
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+        self._trained_size = size
+        print(f"🧭 Trained face index: {nlist} lists over {size} students")
+
+
+class IVFSnapshot:
+    """Immutable inverted lists attached to one GalleryView"""
+
+    def __init__(self, centroids, lists, nprobe):
+        self.centroids = centroids
+        self.lists = lists
+        self.nprobe = nprobe
+
+    def search(self, view, probes, k, nprobe=None):
+        """Approximate ``top_k``; rows missing from the scanned lists pad with index -1 and distance inf"""
+        probes = np.atleast_2d(np.asarray(probes, dtype=np.float32))
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        unit_probes = probes / (np.linalg.norm(probes, axis=1, keepdims=True) + 1e-7)
+        closest = np.argpartition(-(unit_probes @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        indices = np.full((len(probes), k), -1, dtype=np.int64)
+        distances = np.full((len(probes), k), np.inf, dtype=np.float32)
+        for i, list_ids in enumerate(closest):
+            rows = np.concatenate([self.lists[list_id] for list_id in list_ids])
+            if len(rows) == 0:
+                continue
+            candidate_distances = view.distances(probes[i:i + 1], rows)[0]
+            found = min(k, len(rows))
+            best = np.argpartition(candidate_distances, found - 1)[:found]
+            best = best[np.argsort(candidate_distances[best])]
+            indices[i, :found] = rows[best]
+            distances[i, :found] = candidate_distances[best]
+        return indices, distances
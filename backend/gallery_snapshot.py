@@ -0,0 +1,129 @@
+import json
+import os
+import shutil
+import uuid
+import numpy as np
+
+# On-disk gallery snapshots shared by every worker process
+GALLERY_SNAPSHOT_DIR = os.environ.get(
+    "GALLERY_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'gallery'))
+# Snapshots kept per database and encoding model; older ones are deleted once a newer one is written
+GALLERY_SNAPSHOT_KEEP = int(os.environ.get("GALLERY_SNAPSHOT_KEEP", 2))
+
+# One directory per (database id, encoding model, enrollment version):
+#   encodings.npy  unit-length float32 rows     norms.npy  original row norms (float32)
+#   ids.npy        student ids (int64)          index.json names, roll numbers and header fields
+# Galleries of different encoding models never share a snapshot.
+SNAPSHOT_PREFIX = 'gallery-'
+
+
+class GallerySnapshot:
+    """A gallery snapshot mapped read-only; the OS page cache shares it across processes"""
+
+    def __init__(self, database_id, model_name, version, ids, names, rolls, matrix, norms):
+        self.database_id = database_id
+        self.model_name = model_name
+        self.version = version
+        self.ids = ids
+        self.names = names
+        self.rolls = rolls
+        self.matrix = matrix
+        self.norms = norms
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _snapshot_prefix(database_id, model_name):
+    return f"{SNAPSHOT_PREFIX}{database_id}-{model_name}-"
+
+
+def _snapshot_name(database_id, model_name, version):
+    return f"{_snapshot_prefix(database_id, model_name)}{version:012d}"
+
+
+def _list_snapshots(database_id, model_name, snapshot_dir):
+    """Versions of the snapshots written for a database and encoding model, newest first"""
+    prefix = _snapshot_prefix(database_id, model_name)
+    try:
+        names = os.listdir(snapshot_dir)
+    except FileNotFoundError:
+        return []
+    versions = [int(name[len(prefix):]) for name in names if name.startswith(prefix) and name[len(prefix):].isdigit()]
+    return sorted(versions, reverse=True)
+
+
+def load_gallery_snapshot(database_id, model, max_version, snapshot_dir=GALLERY_SNAPSHOT_DIR):
+    """Map the newest snapshot of a database's ``model`` gallery at or before ``max_version``; None if there is none usable"""
+    dim = model.dim
+    for version in _list_snapshots(database_id, model.name, snapshot_dir):
+        if version > max_version:
+            continue
+        path = os.path.join(snapshot_dir, _snapshot_name(database_id, model.name, version))
+        try:
+            with open(os.path.join(path, 'index.json')) as f:
+                index = json.load(f)
+            matrix = np.load(os.path.join(path, 'encodings.npy'), mmap_mode='r')
+            norms = np.load(os.path.join(path, 'norms.npy'), mmap_mode='r')
+            ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode='r')
+            count = index['count']
+            if index['model'] != model.name or index['dim'] != dim or matrix.shape != (count, dim) or len(norms) != count or len(ids) != count \
+                    or len(index['names']) != count or len(index['rolls']) != count:
+                raise ValueError("snapshot files do not agree")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Ignoring gallery snapshot {os.path.basename(path)}: {e}")
+            continue
+        return GallerySnapshot(database_id, model.name, version, ids, np.array(index['names'], dtype=object),
+                               np.array(index['rolls'], dtype=object), matrix, norms)
+    return None
+
+
+def write_gallery_snapshot(database_id, model, version, view, snapshot_dir=GALLERY_SNAPSHOT_DIR,
+                           keep=GALLERY_SNAPSHOT_KEEP):
+    """Persist a ``model`` gallery view as the snapshot for ``version``; returns False when another worker already did"""
+    final_path = os.path.join(snapshot_dir, _snapshot_name(database_id, model.name, version))
+    if os.path.isdir(final_path):
+        return False
+
+    # Written under a private name and renamed into place, so readers never see a partial snapshot
+    os.makedirs(snapshot_dir, exist_ok=True)
+    temp_path = os.path.join(snapshot_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(temp_path)
+    try:
+        np.save(os.path.join(temp_path, 'encodings.npy'), np.ascontiguousarray(view.matrix, dtype=np.float32))
+        np.save(os.path.join(temp_path, 'norms.npy'), np.asarray(view.norms, dtype=np.float32))
+        np.save(os.path.join(temp_path, 'ids.npy'), np.asarray(view.ids, dtype=np.int64))
+        with open(os.path.join(temp_path, 'index.json'), 'w') as f:
+            json.dump({
+                'database_id': database_id,
+                'version': version,
+                'model': model.name,
+                'dim': view.dim,
+                'count': len(view),
+                'names': list(view.names),
+                'rolls': list(view.rolls)
+            }, f)
+        os.rename(temp_path, final_path)
+    except OSError:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        if os.path.isdir(final_path):
+            return False
+        raise
+
+    _prune_snapshots(database_id, model.name, snapshot_dir, keep)
+    return True
+
+
+def _prune_snapshots(database_id, model_name, snapshot_dir, keep):
+    # Processes still mapping a deleted snapshot keep reading it until they unmap it.
+    # Other models' snapshots of this database are left alone; their services prune them.
+    database_prefix = f"{SNAPSHOT_PREFIX}{database_id}-"
+    model_prefix = _snapshot_prefix(database_id, model_name)
+    current = set(_snapshot_name(database_id, model_name, version)
+                  for version in _list_snapshots(database_id, model_name, snapshot_dir)[:keep])
+    for name in os.listdir(snapshot_dir):
+        if not name.startswith(SNAPSHOT_PREFIX) or name in current:
+            continue
+        # Stale databases, older versions of this model, and snapshots written before models were recorded
+        if not name.startswith(database_prefix) or name.startswith(model_prefix) or name[len(database_prefix):].isdigit():
+            shutil.rmtree(os.path.join(snapshot_dir, name), ignore_errors=True)
@@ -1,6 +1,7 @@
 import cv2
 import numpy as np
 from database import get_student_by_roll_id, save_id_card_verification
+from encoding_models import DLIB_RESNET
 import os
 
 class IDVerificationService:
@@ -48,6 +49,13 @@ class IDVerificationService:
                 'message': 'No face detected in ID card photo'
             }
         
+        # Only encodings of the same model can be compared
+        if student['encoding_model'] != DLIB_RESNET.name:
+            return {
+                'status': 'error',
+                'message': f'Enrolled face of {student["name"]} was encoded with {student["encoding_model"]}; re-embed it first'
+            }
+        
         # Compare with enrolled face encoding
         enrolled_encoding = student['face_encoding']
         face_distance = face_recognition.face_distance([enrolled_encoding], id_card_encoding)[0]
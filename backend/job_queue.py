@@ -0,0 +1,260 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from database import (create_job, update_job, get_job, get_recent_jobs, fail_interrupted_jobs, delete_finished_jobs,
+                      is_job_cancel_requested, touch_jobs, request_cancel_unfinished_jobs, count_unfinished_jobs)
+
+# Background job configuration
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_DIR = os.environ.get("JOB_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'jobs'))
+# Finished jobs and their files are removed after this many seconds
+JOB_RETENTION = int(os.environ.get("JOB_RETENTION", 24 * 60 * 60))
+# Minimum seconds between progress writes for one job
+JOB_PROGRESS_INTERVAL = float(os.environ.get("JOB_PROGRESS_INTERVAL", 0.5))
+# Unfinished jobs carry their queue's heartbeat; other worker processes fail them once it is this old
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get("JOB_HEARTBEAT_INTERVAL", 10))
+JOB_HEARTBEAT_TIMEOUT = int(os.environ.get("JOB_HEARTBEAT_TIMEOUT", 60))
+
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once cancellation of its job was requested"""
+
+
+class JobContext:
+    """Handed to job handlers to report progress, check for cancellation and write result files"""
+
+    def __init__(self, job_id, work_dir, cancel_event):
+        self.id = job_id
+        self.work_dir = work_dir
+        self.result_path = None
+        self._cancel_event = cancel_event
+        self._stage = None
+        self._unsaved = {}
+        self._last_write = 0.0
+        self._last_cancel_poll = time.monotonic()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled once cancellation was requested here or through another worker process"""
+        now = time.monotonic()
+        if not self._cancel_event.is_set() and now - self._last_cancel_poll >= JOB_PROGRESS_INTERVAL:
+            # Throttled like progress writes; another process can only flag the job record
+            self._last_cancel_poll = now
+            if is_job_cancel_requested(self.id):
+                self._cancel_event.set()
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def progress(self, done=None, total=None, stage=None):
+        """Record progress; writes are throttled except when the stage changes"""
+        if done is not None:
+            self._unsaved['progress_done'] = done
+        if total is not None:
+            self._unsaved['progress_total'] = total
+        stage_changed = stage is not None and stage != self._stage
+        if stage_changed:
+            self._unsaved['stage'] = self._stage = stage
+
+        now = time.monotonic()
+        if self._unsaved and (stage_changed or now - self._last_write >= JOB_PROGRESS_INTERVAL):
+            update_job(self.id, **self._unsaved)
+            self._unsaved = {}
+            self._last_write = now
+
+    def unsaved_progress(self):
+        """Progress recorded since the last throttled write"""
+        unsaved, self._unsaved = self._unsaved, {}
+        return unsaved
+
+    def result_file(self, filename):
+        """Path for a downloadable result; the job's download endpoint serves it"""
+        self.result_path = os.path.join(self.work_dir, os.path.basename(filename))
+        return self.result_path
+
+
+def public_job(job):
+    """Job record as returned by the API"""
+    view = {
+        'job_id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'processed': job['progress_done'],
+        'total': job['progress_total'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'cancel_requested': job['cancel_requested']
+    }
+    if job['result'] is not None:
+        view['result'] = job['result']
+    if job['error']:
+        view['error'] = job['error']
+    if job['result_path'] and job['status'] == 'completed':
+        view['download_url'] = f"/jobs/{job['id']}/download"
+    return view
+
+
+class JobQueue:
+    """Runs long admin operations on a small worker pool, persisting every job in SQLite.
+
+    Handlers are registered per job kind and called as ``handler(job, **params)``
+    with a JobContext; whatever they return is stored as the job result.
+    Job records survive restarts. Each queue owns the jobs it accepted and
+    keeps their heartbeat fresh; jobs whose owner stopped beating (its
+    process exited) are marked failed by whichever queue notices first, so
+    several server processes can share the jobs table. Cancellation
+    requested through any process reaches the handler at its next
+    checkpoint.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, job_dir=JOB_DIR, retention=JOB_RETENTION,
+                 heartbeat_interval=JOB_HEARTBEAT_INTERVAL, heartbeat_timeout=JOB_HEARTBEAT_TIMEOUT):
+        self.workers = workers
+        self.job_dir = job_dir
+        self.retention = retention
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker")
+        self._handlers = {}
+        self._cancel_events = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        self._fail_interrupted()
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+        print(f"🗂️ Job queue ready ({workers} workers)")
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def new_job_id(self):
+        return uuid.uuid4().hex
+
+    def work_dir(self, job_id):
+        """Directory for a job's uploads and result files, removed with the job record"""
+        path = os.path.join(self.job_dir, job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def submit(self, kind, params=None, job_id=None):
+        """Persist a job and queue it; returns the public job record"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        self._prune()
+        job_id = job_id or self.new_job_id()
+        params = params or {}
+        create_job(job_id, kind, params, self.owner)
+
+        with self._lock:
+            self._cancel_events[job_id] = threading.Event()
+        self.executor.submit(self._run, job_id, kind, params)
+        print(f"🗂️ Queued {kind} job {job_id[:8]}")
+        return self.get(job_id)
+
+    def get(self, job_id):
+        job = get_job(job_id)
+        return public_job(job) if job else None
+
+    def get_result_path(self, job_id):
+        job = get_job(job_id)
+        if job is None or job['status'] != 'completed':
+            return None
+        return job['result_path']
+
+    def recent(self, kind=None, limit=50):
+        return [public_job(job) for job in get_recent_jobs(kind, limit)]
+
+    def cancel(self, job_id):
+        """Request cancellation; queued jobs never start and running ones stop at their next checkpoint"""
+        job = get_job(job_id)
+        if job is None:
+            return None
+        if job['status'] in FINISHED_STATUSES:
+            return public_job(job)
+
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        update_job(job_id, cancel_requested=1)
+        return self.get(job_id)
+
+    def cancel_all(self):
+        """Request cancellation of every unfinished job, including those of other server processes"""
+        with self._lock:
+            for event in self._cancel_events.values():
+                event.set()
+        return request_cancel_unfinished_jobs()
+
+    def unfinished(self):
+        """Number of jobs still queued or running in any server process"""
+        return count_unfinished_jobs()
+
+    def shutdown(self):
+        # Let running jobs stop at their next checkpoint and drop the queued ones
+        with self._lock:
+            for event in self._cancel_events.values():
+                event.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self._stopped.set()
+        self._heartbeat_thread.join()
+
+    def _heartbeat(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                touch_jobs(self.owner)
+                self._fail_interrupted()
+            except Exception as e:
+                print(f"⚠️ Job heartbeat failed: {e}")
+
+    def _fail_interrupted(self):
+        interrupted = fail_interrupted_jobs(self.heartbeat_timeout)
+        if interrupted:
+            print(f"⚠️ Marked {interrupted} interrupted jobs as failed")
+
+    def _run(self, job_id, kind, params):
+        with self._lock:
+            cancel_event = self._cancel_events[job_id]
+        work_dir = self.work_dir(job_id)
+        job = JobContext(job_id, work_dir, cancel_event)
+
+        try:
+            if cancel_event.is_set() or is_job_cancel_requested(job_id):
+                update_job(job_id, status='cancelled', finished_at='now')
+                return
+
+            update_job(job_id, status='running', started_at='now')
+            result = self._handlers[kind](job, **params)
+            update_job(job_id, **{**job.unsaved_progress(), 'status': 'completed', 'stage': 'done', 'result': result,
+                                  'result_path': job.result_path, 'finished_at': 'now'})
+            print(f"✅ {kind} job {job_id[:8]} completed")
+        except JobCancelled:
+            update_job(job_id, status='cancelled', finished_at='now')
+            print(f"🛑 {kind} job {job_id[:8]} cancelled")
+        except Exception as e:
+            update_job(job_id, status='failed', error=str(e), finished_at='now')
+            print(f"❌ {kind} job {job_id[:8]} failed: {e}")
+        finally:
+            with self._lock:
+                self._cancel_events.pop(job_id, None)
+            if job.result_path is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _prune(self):
+        try:
+            for job_id in delete_finished_jobs(self.retention):
+                shutil.rmtree(os.path.join(self.job_dir, job_id), ignore_errors=True)
+        except Exception as e:
+            print(f"⚠️ Job cleanup failed: {e}")
@@ -0,0 +1,104 @@
+import os
+import cv2
+import numpy as np
+
+# Motion gating configuration; set MOTION_GATE=0 to process every frame
+MOTION_GATE = os.environ.get("MOTION_GATE", "1") != "0"
+MOTION_THUMBNAIL_WIDTH = int(os.environ.get("MOTION_THUMBNAIL_WIDTH", 64))
+# A thumbnail pixel counts as changed when its gray level moves by more than this
+MOTION_PIXEL_THRESHOLD = int(os.environ.get("MOTION_PIXEL_THRESHOLD", 15))
+# Frames with fewer changed pixels than this fraction (inside the ROI) reuse the previous results
+MOTION_CHANGED_FRACTION = float(os.environ.get("MOTION_CHANGED_FRACTION", 0.01))
+# Consecutive frames that may be skipped before one is processed regardless
+MOTION_MAX_SKIP = int(os.environ.get("MOTION_MAX_SKIP", 30))
+
+
+def parse_roi(roi):
+    """Regions from "x,y,w,h;x,y,w,h" in fractions of the frame; None when empty"""
+    if not roi:
+        return None
+    regions = []
+    for part in roi.split(';'):
+        values = [float(value) for value in part.split(',')]
+        if len(values) != 4 or any(value < 0 or value > 1 for value in values):
+            raise ValueError(f"Invalid ROI region: {part}")
+        x, y, w, h = values
+        # An empty region would select no pixels, and one past the edge is a client mistake
+        if w <= 0 or h <= 0 or x + w > 1 + 1e-9 or y + h > 1 + 1e-9:
+            raise ValueError(f"Invalid ROI region: {part}")
+        regions.append(tuple(values))
+    return tuple(regions) or None
+
+
+class MotionGate:
+    """Per-camera change detector that lets unchanged frames skip recognition.
+
+    Each frame is decoded at reduced size straight to a small grayscale
+    thumbnail and compared with the thumbnail of the last frame that was
+    fully processed. When too few pixels changed (only pixels inside the
+    optional ROI count), the previous results are returned again without
+    detection, embedding or matching. Gates are pickled with the tracker
+    when frames run in worker processes.
+    """
+
+    def __init__(self, roi=None, thumbnail_width=MOTION_THUMBNAIL_WIDTH, pixel_threshold=MOTION_PIXEL_THRESHOLD,
+                 changed_fraction=MOTION_CHANGED_FRACTION, max_skip=MOTION_MAX_SKIP):
+        self.roi = roi
+        self.thumbnail_width = thumbnail_width
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.max_skip = max_skip
+        self.frames_skipped = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the reference frame so the next frame is processed in full"""
+        self._reference = None
+        self._mask = None
+        self._results = None
+        self._key = None
+        self._skipped_in_row = 0
+
+    def thumbnail(self, frame_bytes):
+        """Blurred grayscale thumbnail, decoded at 1/8 scale where the JPEG allows it"""
+        small = cv2.imdecode(np.frombuffer(frame_bytes, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if small is None:
+            return None
+        height = max(1, round(small.shape[0] * self.thumbnail_width / small.shape[1]))
+        thumbnail = cv2.resize(small, (self.thumbnail_width, height), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(thumbnail, (3, 3), 0)
+
+    def unchanged(self, thumbnail, key=None):
+        """True when the frame can reuse the results of the last processed frame"""
+        if (thumbnail is None or self._reference is None or thumbnail.shape != self._reference.shape
+                or key != self._key or self._skipped_in_row >= self.max_skip):
+            return False
+        changed = cv2.absdiff(thumbnail, self._reference) > self.pixel_threshold
+        if self._mask is not None:
+            changed = changed[self._mask]
+        # A mask that selects no pixels can never show the frame is unchanged
+        return changed.size > 0 and changed.mean() < self.changed_fraction
+
+    def cached_results(self):
+        """Results of the last processed frame; attendance was already marked for them"""
+        self._skipped_in_row += 1
+        self.frames_skipped += 1
+        return [dict(result, attendance_marked=False) for result in self._results]
+
+    def update(self, thumbnail, results, key=None):
+        """Make a fully processed frame the new reference"""
+        if thumbnail is not None and (self._reference is None or thumbnail.shape != self._reference.shape):
+            self._mask = self._roi_mask(thumbnail.shape)
+        self._reference = thumbnail
+        self._results = results
+        self._key = key
+        self._skipped_in_row = 0
+
+    def _roi_mask(self, shape):
+        if not self.roi:
+            return None
+        height, width = shape
+        mask = np.zeros(shape, dtype=bool)
+        for x, y, w, h in self.roi:
+            mask[int(y * height):int(np.ceil((y + h) * height)), int(x * width):int(np.ceil((x + w) * width))] = True
+        return mask
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+from face_tracker import FaceTracker
+from motion_gate import MotionGate, MOTION_GATE
+
+# Sessions idle for longer than this are dropped from the registry
+SESSION_IDLE_TIMEOUT = 15 * 60
+
+
+class ClassScope:
+    """The students a camera expects to see: a department/section and/or an explicit roster.
+
+    Matching searches only these students first; with ``fallback`` faces that
+    match nobody in the class are retried against the whole gallery.
+    Scopes are small and picklable so they can travel to process-pool workers.
+    """
+
+    def __init__(self, department=None, section=None, roll_ids=None, fallback=False):
+        self.department = department or None
+        self.section = section or None
+        self.roll_ids = tuple(sorted(set(roll_ids))) if roll_ids is not None else None
+        self.fallback = bool(fallback)
+
+    @classmethod
+    def from_params(cls, department="", section="", roster="", fallback=False):
+        """Scope from request parameters; None when nothing narrows the gallery"""
+        roll_ids = [roll_id.strip() for roll_id in roster.split(',') if roll_id.strip()] if roster else None
+        if not department and not section and not roll_ids:
+            return None
+        return cls(department, section, roll_ids, fallback)
+
+    def key(self):
+        return (self.department, self.section, self.roll_ids, self.fallback)
+
+    def __eq__(self, other):
+        return isinstance(other, ClassScope) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def summary(self):
+        return {
+            'department': self.department,
+            'section': self.section,
+            'roster_size': len(self.roll_ids) if self.roll_ids is not None else None,
+            'fallback': self.fallback
+        }
+
+
+class RecognitionSession:
+    """Server-side state for one live camera"""
+
+    def __init__(self, camera_id):
+        self.camera_id = camera_id
+        self.marked_student_ids = set()
+        self.tracker = FaceTracker()
+        self.scope = None
+        self.motion_gate = MotionGate() if MOTION_GATE else None
+        # Frames of one camera are processed in order so the tracker sees a consistent sequence
+        self.lock = asyncio.Lock()
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+        self.started_at = time.time()
+        self.last_seen = self.started_at
+
+    async def configure(self, scope, roi):
+        """Apply a request's class scope and motion ROI once no frame of this camera is in flight
+
+        A frame running in the pool writes its tracker and gate back when it
+        finishes; changing them under the same lock keeps that write-back
+        from undoing the change.
+        """
+        async with self.lock:
+            self.set_scope(scope)
+            self.set_motion_roi(roi)
+
+    def set_scope(self, scope):
+        """Restrict matching to a class; tracked identities and cached results from another scope are dropped"""
+        if scope != self.scope:
+            self.scope = scope
+            self.tracker = FaceTracker()
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
+
+    def set_motion_roi(self, roi):
+        """Only count motion inside these (x, y, w, h) frame fractions; None watches the whole frame"""
+        if self.motion_gate is not None and roi != self.motion_gate.roi:
+            self.motion_gate.roi = roi
+            self.motion_gate.reset()
+
+    def record_results(self, results):
+        """Remember which students this camera has already seen"""
+        self.frames_processed += 1
+        self.last_seen = time.time()
+        for result in results:
+            if result.get('student_id') is not None:
+                self.marked_student_ids.add(result['student_id'])
+
+    def summary(self):
+        return {
+            'camera_id': self.camera_id,
+            'scope': self.scope.summary() if self.scope else None,
+            'students_seen': len(self.marked_student_ids),
+            'active_tracks': len(self.tracker.tracks),
+            'frames_received': self.frames_received,
+            'frames_processed': self.frames_processed,
+            'frames_dropped': self.frames_dropped,
+            'frames_skipped': self.motion_gate.frames_skipped if self.motion_gate is not None else 0
+        }
+
+
+class SessionRegistry:
+    """Recognition sessions keyed by camera id"""
+
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, camera_id):
+        with self._lock:
+            self._expire_idle()
+            session = self._sessions.get(camera_id)
+            if session is None:
+                session = RecognitionSession(camera_id)
+                self._sessions[camera_id] = session
+            return session
+
+    def remove(self, camera_id):
+        with self._lock:
+            self._sessions.pop(camera_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _expire_idle(self):
+        cutoff = time.time() - self.idle_timeout
+        for camera_id in [c for c, s in self._sessions.items() if s.last_seen < cutoff]:
+            del self._sessions[camera_id]
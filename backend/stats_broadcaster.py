@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+from database import get_attendance_stats, get_stats_fingerprint, invalidate_stats_cache
+
+# How often the change marker is checked while at least one dashboard is connected
+STATS_STREAM_INTERVAL = float(os.environ.get("STATS_STREAM_INTERVAL", 1.0))
+# Comment lines keep idle connections open through proxies
+STATS_STREAM_KEEPALIVE = float(os.environ.get("STATS_STREAM_KEEPALIVE", 15.0))
+
+
+class StatsBroadcaster:
+    """Pushes dashboard statistics to every connected subscriber when attendance changes.
+
+    A single background task checks a cheap change marker while anyone is
+    subscribed, recomputes the statistics once per change and hands the same
+    serialized snapshot to every subscriber. With no subscribers the task
+    exits, so idle dashboards cost nothing.
+    """
+
+    def __init__(self, interval=STATS_STREAM_INTERVAL):
+        self.interval = interval
+        self._subscribers = set()
+        self._task = None
+        self._fingerprint = None
+        self._snapshot = None
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        # Each subscriber only needs the newest snapshot, older ones are replaced
+        queue = asyncio.Queue(maxsize=1)
+        self._subscribers.add(queue)
+        if self._snapshot is not None:
+            queue.put_nowait(self._snapshot)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    async def events(self):
+        """Server-sent event stream for one client"""
+        queue = self.subscribe()
+        try:
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), timeout=STATS_STREAM_KEEPALIVE)
+                    yield f"data: {snapshot}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._subscribers:
+            try:
+                fingerprint = await loop.run_in_executor(None, get_stats_fingerprint)
+                if fingerprint != self._fingerprint:
+                    # Marks from worker processes do not reach this process's cache
+                    invalidate_stats_cache()
+                    stats = await loop.run_in_executor(None, get_attendance_stats)
+                    self._fingerprint = fingerprint
+                    self._publish(json.dumps(stats))
+            except Exception as e:
+                print(f"⚠️ Stats stream refresh failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _publish(self, snapshot):
+        self._snapshot = snapshot
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(snapshot)
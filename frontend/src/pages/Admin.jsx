@@ -1,4 +1,5 @@
 import React, { useState } from 'react';
+import { waitForJob, downloadJobResult } from '../utils/jobs';
 
 const Admin = () => {
   const [alertDate, setAlertDate] = useState(new Date().toISOString().split('T')[0]);
@@ -58,7 +59,12 @@ const Admin = () => {
       });
       
       if (response.ok) {
-        const result = await response.json();
+        const job = await waitForJob((await response.json()).job_id);
+        if (job.status !== 'completed') {
+          alert(job.error || 'Failed to send email alerts');
+          return;
+        }
+        const result = job.result;
         // Open Gmail for each absent student individually
         if (result.email_sent > 0) {
           // Gmail will open automatically from backend
@@ -93,7 +99,12 @@ const Admin = () => {
       });
       
       if (response.ok) {
-        const result = await response.json();
+        const job = await waitForJob((await response.json()).job_id);
+        if (job.status !== 'completed') {
+          alert(job.error || 'Failed to send WhatsApp alerts');
+          return;
+        }
+        const result = job.result;
         // Show professional notification instead of alert
         showProfessionalNotification({
           title: 'WhatsApp Alerts Initiated', 
@@ -117,15 +128,13 @@ const Admin = () => {
       const response = await fetch(`https://neuroattend-dev.onrender.com/export-attendance-csv?date=${exportDate}&type=${type}`);
       
       if (response.ok) {
-        const blob = await response.blob();
-        const url = window.URL.createObjectURL(blob);
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = `attendance_${type}_${exportDate}.csv`;
-        document.body.appendChild(a);
-        a.click();
-        window.URL.revokeObjectURL(url);
-        document.body.removeChild(a);
+        // The report is generated in a background job and downloaded once it is ready
+        const job = await waitForJob((await response.json()).job_id);
+        if (job.status !== 'completed') {
+          alert(job.error || 'Export failed');
+          return;
+        }
+        await downloadJobResult(job);
         
         // Show professional notification instead of alert
         showProfessionalNotification({
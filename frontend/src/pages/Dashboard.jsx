@@ -15,10 +15,6 @@ const Dashboard = () => {
     recent_absent: []
   });
 
-  useEffect(() => {
-    loadDashboard();
-  }, []);
-
   const loadDashboard = async () => {
     try {
       const response = await fetch('https://neuroattend-dev.onrender.com/stats');
@@ -34,10 +30,33 @@ const Dashboard = () => {
     }
   };
 
-  // Refresh stats every 10 seconds for faster updates
+  // The server pushes a new snapshot whenever attendance changes; poll only if streaming is unavailable
   useEffect(() => {
-    const interval = setInterval(loadDashboard, 10000);
-    return () => clearInterval(interval);
+    let interval = null;
+    const startPolling = () => {
+      if (interval) return;
+      loadDashboard();
+      interval = setInterval(loadDashboard, 10000);
+    };
+
+    if (!window.EventSource) {
+      startPolling();
+      return () => clearInterval(interval);
+    }
+
+    const source = new EventSource('https://neuroattend-dev.onrender.com/stats/stream');
+    source.onmessage = (event) => {
+      setStats(JSON.parse(event.data));
+    };
+    source.onerror = () => {
+      // EventSource reconnects on its own unless the server refused the stream
+      if (source.readyState === EventSource.CLOSED) startPolling();
+    };
+
+    return () => {
+      source.close();
+      clearInterval(interval);
+    };
   }, []);
 
   const weeklyChartData = {
@@ -1,5 +1,6 @@
 import React, { useState } from 'react';
 import Toast from '../components/Toast';
+import { waitForJob, cancelJob } from '../utils/jobs';
 
 const Enrollment = () => {
   const [individualForm, setIndividualForm] = useState({
@@ -23,6 +24,7 @@ const Enrollment = () => {
   });
 
   const [toast, setToast] = useState(null);
+  const [bulkProgress, setBulkProgress] = useState(null);
 
   const showToast = (message, type = 'info') => {
     setToast({ message, type });
@@ -71,6 +73,18 @@ const Enrollment = () => {
     }
   };
 
+  const finishBulkJob = (job) => {
+    setBulkProgress(null);
+    if (job.status === 'completed') {
+      const result = job.result || {};
+      showToast(`Bulk Enrollment: ${result.enrolled?.length || 0} enrolled, ${result.failed?.length || 0} failed`, result.failed?.length > 0 ? 'warning' : 'success');
+    } else if (job.status === 'cancelled') {
+      showToast('Bulk enrollment cancelled', 'warning');
+    } else {
+      showToast(job.error || 'Bulk enrollment failed', 'error');
+    }
+  };
+
   const handleBulkSubmit = async (e) => {
     e.preventDefault();
     
@@ -94,9 +108,9 @@ const Enrollment = () => {
       });
       
       if (response.ok) {
-        const result = await response.json();
+        const job = await response.json();
         
-        showToast(`Bulk Enrollment: ${result.enrolled?.length || 0} enrolled, ${result.failed?.length || 0} failed`, result.failed?.length > 0 ? 'warning' : 'success');
+        setBulkProgress(job);
         setBulkForm({ csvFile: null, photosZip: null });
         
         // Reset file inputs
@@ -106,6 +120,8 @@ const Enrollment = () => {
             input.value = '';
           }
         });
+        
+        finishBulkJob(await waitForJob(job.job_id, setBulkProgress));
       } else {
         const error = await response.json();
         showToast(error.detail || 'Bulk enrollment failed', 'error');
@@ -428,6 +444,28 @@ const Enrollment = () => {
                   </svg>
                   Bulk Enroll from CSV
                 </button>
+                
+                {bulkProgress && (
+                  <div className="text-white/80 text-sm">
+                    <div className="flex justify-between mb-1">
+                      <span className="capitalize">{bulkProgress.stage || bulkProgress.status}</span>
+                      <span>{bulkProgress.processed} / {bulkProgress.total}</span>
+                    </div>
+                    <div className="w-full bg-white/20 rounded-full h-2">
+                      <div
+                        className="bg-gradient-to-r from-purple-500 to-pink-500 h-2 rounded-full transition-all duration-300"
+                        style={{ width: `${bulkProgress.total ? Math.round(100 * bulkProgress.processed / bulkProgress.total) : 0}%` }}
+                      />
+                    </div>
+                    <button
+                      type="button"
+                      onClick={() => cancelJob(bulkProgress.job_id)}
+                      className="mt-2 text-xs text-white/70 underline hover:text-white"
+                    >
+                      Cancel
+                    </button>
+                  </div>
+                )}
               </form>
             </div>
 
@@ -1,5 +1,17 @@
 import React, { useState, useRef, useEffect } from 'react';
 
+// Each tab is its own camera to the server, so tracking and motion gating never mix feeds
+const getCameraId = () => {
+  let cameraId = sessionStorage.getItem('neuroattend-camera-id');
+  if (!cameraId) {
+    cameraId = window.crypto?.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+    sessionStorage.setItem('neuroattend-camera-id', cameraId);
+  }
+  return cameraId;
+};
+
 const LiveFeed = () => {
   const [isRecognizing, setIsRecognizing] = useState(false);
   const [results, setResults] = useState([]);
@@ -10,6 +22,7 @@ const LiveFeed = () => {
   const videoRef = useRef(null);
   const canvasRef = useRef(null);
   const overlayRef = useRef(null);
+  const socketRef = useRef(null);
 
   const startRecognition = async () => {
     try {
@@ -21,6 +34,7 @@ const LiveFeed = () => {
         } 
       });
       videoRef.current.srcObject = stream;
+      openRecognitionSocket();
       setIsRecognizing(true);
       setSessionActive(true);
       setSessionStudents(new Set());
@@ -37,6 +51,74 @@ const LiveFeed = () => {
     }
   };
 
+  const openRecognitionSocket = () => {
+    // Stream frames over a WebSocket; HTTP POSTs are used while it is unavailable
+    const socket = new WebSocket(`wss://neuroattend-dev.onrender.com/ws/recognize?camera_id=${getCameraId()}`);
+    socket.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.results) {
+        handleRecognitionData(data);
+      }
+    };
+    socket.onerror = () => console.warn('⚠️ Recognition stream unavailable, using HTTP');
+    socketRef.current = socket;
+  };
+
+  const handleRecognitionData = (data) => {
+    if (data.results && data.results.length > 0) {
+      console.log('✅ Recognition results:', data.results);
+      
+      // Check for unknown persons
+      const unknownPersons = data.results.filter(r => 
+        r.type === 'unknown' || 
+        r.type === 'unknown_masked' || 
+        !r.roll_number || 
+        r.name === 'Unknown Person'
+      );
+      
+      if (unknownPersons.length > 0) {
+        setUnknownDetections(prev => {
+          const newCount = prev + unknownPersons.length;
+          
+          // Auto-shutdown after 3 unknown detections
+          if (newCount >= 3) {
+            setSecurityAlert(true);
+            setTimeout(() => {
+              stopRecognition();
+              showSecurityAlert({
+                title: 'Security Alert - Camera Stopped',
+                message: 'Unknown person detected 3 times. Camera automatically stopped for fraud prevention. Please verify authorized personnel only.',
+                type: 'error',
+                duration: 8000
+              });
+            }, 1000);
+          }
+          
+          return newCount;
+        });
+      }
+      
+      setResults(prev => {
+        const newResults = [...prev];
+        data.results.forEach(result => {
+          // Track students in current session
+          if (result.roll_number) {
+            setSessionStudents(prev => new Set([...prev, result.roll_number]));
+          }
+          
+          // Show each person only once per session
+          const exists = newResults.find(r => r.name === result.name);
+          if (!exists) {
+            newResults.push({...result, timestamp: new Date().toLocaleTimeString()});
+          }
+        });
+        return newResults;
+      });
+    } else {
+      console.log('🔍 No faces recognized in this frame');
+    }
+  };
+
   const startFrameProcessing = () => {
     const processFrame = async () => {
       if (!isRecognizing || !videoRef.current) return;
@@ -52,72 +134,29 @@ const LiveFeed = () => {
         const ctx = canvas.getContext('2d');
         ctx.drawImage(video, 0, 0);
         
-        // Convert to base64 with higher quality
-        const frameData = canvas.toDataURL('image/jpeg', 0.95);
-        
-        // Send to backend for recognition
-        const response = await fetch('https://neuroattend-dev.onrender.com/recognize', {
+        // Encode as raw JPEG bytes with higher quality
+        const frameBlob = await new Promise(resolve => canvas.toBlob(resolve, 'image/jpeg', 0.95));
+
+        // Stream to backend if the socket is open, otherwise POST the frame
+        const socket = socketRef.current;
+        if (socket && socket.readyState === WebSocket.OPEN) {
+          socket.send(frameBlob);
+          if (isRecognizing) {
+            setTimeout(processFrame, 500);
+          }
+          return;
+        }
+
+        const response = await fetch(`https://neuroattend-dev.onrender.com/recognize?camera_id=${getCameraId()}`, {
           method: 'POST',
           headers: {
-            'Content-Type': 'application/json',
+            'Content-Type': 'application/octet-stream',
           },
-          body: JSON.stringify({ frame: frameData })
+          body: frameBlob
         });
         
         if (response.ok) {
-          const data = await response.json();
-          if (data.results && data.results.length > 0) {
-            console.log('✅ Recognition results:', data.results);
-            
-            // Check for unknown persons
-            const unknownPersons = data.results.filter(r => 
-              r.type === 'unknown' || 
-              r.type === 'unknown_masked' || 
-              !r.roll_number || 
-              r.name === 'Unknown Person'
-            );
-            
-            if (unknownPersons.length > 0) {
-              setUnknownDetections(prev => {
-                const newCount = prev + unknownPersons.length;
-                
-                // Auto-shutdown after 3 unknown detections
-                if (newCount >= 3) {
-                  setSecurityAlert(true);
-                  setTimeout(() => {
-                    stopRecognition();
-                    showSecurityAlert({
-                      title: 'Security Alert - Camera Stopped',
-                      message: 'Unknown person detected 3 times. Camera automatically stopped for fraud prevention. Please verify authorized personnel only.',
-                      type: 'error',
-                      duration: 8000
-                    });
-                  }, 1000);
-                }
-                
-                return newCount;
-              });
-            }
-            
-            setResults(prev => {
-              const newResults = [...prev];
-              data.results.forEach(result => {
-                // Track students in current session
-                if (result.roll_number) {
-                  setSessionStudents(prev => new Set([...prev, result.roll_number]));
-                }
-                
-                // Show each person only once per session
-                const exists = newResults.find(r => r.name === result.name);
-                if (!exists) {
-                  newResults.push({...result, timestamp: new Date().toLocaleTimeString()});
-                }
-              });
-              return newResults;
-            });
-          } else {
-            console.log('🔍 No faces recognized in this frame');
-          }
+          handleRecognitionData(await response.json());
         } else {
           console.error('❌ Recognition API error:', response.status);
         }
@@ -142,6 +181,10 @@ const LiveFeed = () => {
     if (videoRef.current?.srcObject) {
       videoRef.current.srcObject.getTracks().forEach(track => track.stop());
     }
+    if (socketRef.current) {
+      socketRef.current.close();
+      socketRef.current = null;
+    }
     
     // Record session attendance
     await markAbsentStudents();
@@ -0,0 +1,62 @@
+const API_BASE = 'https://neuroattend-dev.onrender.com';
+
+const isFinished = (job) => ['completed', 'failed', 'cancelled'].includes(job.status);
+
+const pollJob = (jobId, onProgress, resolve) => {
+  const timer = setInterval(async () => {
+    try {
+      const response = await fetch(`${API_BASE}/jobs/${jobId}`);
+      if (!response.ok) return;
+      const job = await response.json();
+      if (isFinished(job)) {
+        clearInterval(timer);
+        resolve(job);
+      } else if (onProgress) {
+        onProgress(job);
+      }
+    } catch (err) {
+      console.error('Job poll error:', err);
+    }
+  }, 2000);
+};
+
+// Resolves with the finished job; streams progress and falls back to polling if the stream drops
+export const waitForJob = (jobId, onProgress) => new Promise((resolve) => {
+  if (!window.EventSource) {
+    pollJob(jobId, onProgress, resolve);
+    return;
+  }
+
+  const source = new EventSource(`${API_BASE}/jobs/${jobId}/stream`);
+  let finished = false;
+  source.onmessage = (event) => {
+    const job = JSON.parse(event.data);
+    if (isFinished(job)) {
+      finished = true;
+      source.close();
+      resolve(job);
+    } else if (onProgress) {
+      onProgress(job);
+    }
+  };
+  source.onerror = () => {
+    source.close();
+    if (!finished) pollJob(jobId, onProgress, resolve);
+  };
+});
+
+export const cancelJob = (jobId) => fetch(`${API_BASE}/jobs/${jobId}/cancel`, { method: 'POST' });
+
+export const downloadJobResult = async (job) => {
+  const response = await fetch(`${API_BASE}${job.download_url}`);
+  if (!response.ok) throw new Error('Download failed');
+  const blob = await response.blob();
+  const url = window.URL.createObjectURL(blob);
+  const a = document.createElement('a');
+  a.href = url;
+  a.download = job.result?.filename || 'download';
+  document.body.appendChild(a);
+  a.click();
+  window.URL.revokeObjectURL(url);
+  document.body.removeChild(a);
+};